@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Cache configuration
+CACHE_DIR = os.getenv("CIVIDOC_CACHE_DIR", ".cache")
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+
+def make_cache_key(*parts):
+    """Build a content-addressed cache key from bytes/str parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Persistent SQLite cache for LLM analyses with LRU eviction and TTL"""
+
+    def __init__(self, path=None, max_bytes=ANALYSIS_CACHE_MAX_BYTES, ttl=ANALYSIS_CACHE_TTL):
+        self.path = path or os.path.join(CACHE_DIR, "analysis_cache.db")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "    key TEXT PRIMARY KEY,"
+                "    value TEXT NOT NULL,"
+                "    size INTEGER NOT NULL,"
+                "    created_at REAL NOT NULL,"
+                "    accessed_at REAL NOT NULL"
+                ")"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return value
+
+    def put(self, key, value):
+        """Store value under key and evict least recently used entries"""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        if self.ttl:
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
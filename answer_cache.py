@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from analysis_cache import CACHE_DIR
+
+# Answer cache configuration
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_MAX_PER_DOC = int(os.getenv("ANSWER_CACHE_MAX_PER_DOC", "200"))
+
+
+class AnswerCache:
+    """Persistent per-document cache of chat answers, matched by question similarity"""
+
+    def __init__(self, path=None, threshold=ANSWER_CACHE_THRESHOLD, max_per_doc=ANSWER_CACHE_MAX_PER_DOC):
+        self.path = path or os.path.join(CACHE_DIR, "answer_cache.db")
+        self.threshold = threshold
+        self.max_per_doc = max_per_doc
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "    id INTEGER PRIMARY KEY,"
+                "    scope TEXT NOT NULL,"
+                "    question TEXT NOT NULL,"
+                "    embedding BLOB NOT NULL,"
+                "    answer TEXT NOT NULL,"
+                "    hits INTEGER NOT NULL DEFAULT 0,"
+                "    accessed_at REAL NOT NULL"
+                ")"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_answers_scope ON answers (scope, accessed_at)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, scope, embedding):
+        """Return the answer to the most similar earlier question in scope, or None"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, embedding, answer FROM answers WHERE scope = ?", (scope,)
+            ).fetchall()
+        best = None
+        if rows:
+            matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32)
+            matrix = matrix.reshape(len(rows), -1)
+            query = np.asarray(embedding, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+            similarities = matrix @ query / np.where(norms == 0, 1, norms)
+            position = int(np.argmax(similarities))
+            if similarities[position] >= self.threshold:
+                best = rows[position]
+
+        with self._lock:
+            self.lookups += 1
+            if best is not None:
+                self.hits += 1
+        if best is None:
+            return None
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE answers SET hits = hits + 1, accessed_at = ? WHERE id = ?",
+                (time.time(), best[0])
+            )
+        return best[2]
+
+    def put(self, scope, question, embedding, answer):
+        """Remember an answer, keeping only the most recently used ones per scope"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO answers (scope, question, embedding, answer, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (scope, question, np.asarray(embedding, dtype=np.float32).tobytes(), answer, time.time())
+            )
+            conn.execute(
+                "DELETE FROM answers WHERE scope = ? AND id NOT IN ("
+                "    SELECT id FROM answers WHERE scope = ? ORDER BY accessed_at DESC LIMIT ?"
+                ")",
+                (scope, scope, self.max_per_doc)
+            )
+
+    def invalidate(self, scope):
+        """Drop every answer of a scope, e.g. when its index is rebuilt"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM answers WHERE scope = ?", (scope,))
+
+    def stats(self):
+        """Return lookup and hit counters since the server started"""
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0
+            }
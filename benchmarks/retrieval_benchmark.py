@@ -0,0 +1,187 @@
+"""Offline retrieval benchmark for the chat retrieval profiles
+
+Indexes every fixture document with a retrieval profile, runs its
+questions through the retriever and similarity cutoff, and reports:
+
+- hit rate: share of questions whose expected phrase is in a retrieved chunk
+- MRR: mean reciprocal rank of the first chunk containing it
+- tokens: size of the answer prompt (QA template, retrieved context, question)
+- latency: retrieval time per question, query embedding included
+
+No LLM is called. Usage, from the repository root:
+
+    python benchmarks/retrieval_benchmark.py
+    python benchmarks/retrieval_benchmark.py --profiles image,pdf,text
+    RETRIEVAL_PROFILES_JSON='{"pdf": {"chunk_size": 512, "top_k": 4}}' python benchmarks/retrieval_benchmark.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval_profiles import RETRIEVAL_PROFILES, get_profile, make_node_parser, make_postprocessors
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "civic_documents.json")
+
+
+def load_fixtures(path):
+    with open(path, encoding="utf-8") as f:
+        documents = json.load(f)["documents"]
+    # A phrase missing from its own document would silently count as a miss
+    for document in documents:
+        text = "\n".join(document["pages"])
+        for item in document["questions"]:
+            if item["expected"] not in text:
+                raise ValueError(f"{document['name']}: expected phrase not found: {item['expected']}")
+    return documents
+
+
+def configure_embeddings(mock):
+    from llama_index.core import Settings
+    if mock:
+        # Constant vectors: exercises the harness only, hit quality is meaningless
+        from llama_index.core.embeddings import MockEmbedding
+        Settings.embed_model = MockEmbedding(embed_dim=768)
+    else:
+        from embedding_service import EmbeddingService, ServiceEmbedding
+        Settings.embed_model = ServiceEmbedding(EmbeddingService())
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def benchmark_document(document, profile_name, repeat):
+    """Index one document with a profile and score retrieval on its questions"""
+    from llama_index.core import Document, VectorStoreIndex
+    from llama_index.core.prompts.default_prompts import DEFAULT_TEXT_QA_PROMPT
+    from llama_index.core.schema import MetadataMode
+    from llama_index.core.utils import get_tokenizer
+
+    profile = get_profile(profile_name)
+    tokenizer = get_tokenizer()
+
+    start = time.perf_counter()
+    nodes = make_node_parser(profile_name).get_nodes_from_documents(
+        [Document(text=page) for page in document["pages"]]
+    )
+    index = VectorStoreIndex(nodes)
+    index_seconds = time.perf_counter() - start
+
+    retriever = index.as_retriever(similarity_top_k=profile["top_k"])
+    postprocessors = make_postprocessors(profile_name)
+
+    results = []
+    for item in document["questions"]:
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            retrieved = retriever.retrieve(item["question"])
+            for postprocessor in postprocessors:
+                retrieved = postprocessor.postprocess_nodes(retrieved)
+            latencies.append(time.perf_counter() - start)
+
+        rank = next(
+            (position for position, node in enumerate(retrieved, 1) if item["expected"] in node.node.get_content()),
+            None
+        )
+        context = "\n\n".join(node.node.get_content(metadata_mode=MetadataMode.LLM) for node in retrieved)
+        prompt = DEFAULT_TEXT_QA_PROMPT.format(context_str=context, query_str=item["question"])
+        results.append({
+            'hit': rank is not None,
+            'reciprocal_rank': 1 / rank if rank else 0.0,
+            'tokens': len(tokenizer(prompt)),
+            'chunks': len(retrieved),
+            'latency': statistics.median(latencies)
+        })
+
+    return {
+        'document': document["name"],
+        'profile': profile_name,
+        'nodes': len(nodes),
+        'index_seconds': index_seconds,
+        'results': results
+    }
+
+
+def summarize(runs):
+    """Aggregate per-question results by profile"""
+    summary = {}
+    for run in runs:
+        entry = summary.setdefault(run['profile'], {'documents': 0, 'nodes': 0, 'results': []})
+        entry['documents'] += 1
+        entry['nodes'] += run['nodes']
+        entry['results'].extend(run['results'])
+    rows = []
+    for profile_name, entry in summary.items():
+        results = entry['results']
+        latencies = [result['latency'] * 1000 for result in results]
+        rows.append({
+            'profile': profile_name,
+            'documents': entry['documents'],
+            'questions': len(results),
+            'chunks_indexed': entry['nodes'],
+            'hit_rate': sum(result['hit'] for result in results) / len(results),
+            'mrr': statistics.mean(result['reciprocal_rank'] for result in results),
+            'chunks_per_answer': statistics.mean(result['chunks'] for result in results),
+            'tokens_per_answer': statistics.mean(result['tokens'] for result in results),
+            'latency_p50_ms': percentile(latencies, 0.5),
+            'latency_p95_ms': percentile(latencies, 0.95)
+        })
+    return rows
+
+
+def print_table(rows):
+    columns = [
+        ('profile', '{}'), ('documents', '{}'), ('questions', '{}'), ('chunks_indexed', '{}'),
+        ('hit_rate', '{:.0%}'), ('mrr', '{:.2f}'), ('chunks_per_answer', '{:.1f}'),
+        ('tokens_per_answer', '{:.0f}'), ('latency_p50_ms', '{:.1f}'), ('latency_p95_ms', '{:.1f}')
+    ]
+    cells = [[name for name, _ in columns]]
+    cells += [[fmt.format(row[name]) for name, fmt in columns] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    for line in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat retrieval profiles on a fixture set")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="fixture JSON file")
+    parser.add_argument(
+        "--profiles",
+        help="comma-separated profiles to run on every document (default: each document's own profile)"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="retrievals per question; the median is reported")
+    parser.add_argument("--mock-embeddings", action="store_true", help="smoke-test the harness without the embedding model")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    documents = load_fixtures(args.fixtures)
+    profiles = args.profiles.split(",") if args.profiles else None
+    for profile_name in profiles or []:
+        if profile_name not in RETRIEVAL_PROFILES:
+            parser.error(f"unknown profile: {profile_name}")
+    configure_embeddings(args.mock_embeddings)
+
+    runs = []
+    for document in documents:
+        for profile_name in profiles or [document["profile"]]:
+            runs.append(benchmark_document(document, profile_name, args.repeat))
+
+    rows = summarize(runs)
+    if args.json:
+        print(json.dumps({'profiles': {name: get_profile(name) for name in {row['profile'] for row in rows}}, 'summary': rows}, indent=2))
+        return
+    for row in rows:
+        print(f"{row['profile']}: {json.dumps(get_profile(row['profile']))}")
+    print()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Registry limits for chat engines held in memory across all sessions
+CHAT_ENGINE_MAX_COUNT = int(os.getenv("CHAT_ENGINE_MAX_COUNT", "64"))
+CHAT_ENGINE_MAX_BYTES = int(os.getenv("CHAT_ENGINE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Conversations of evicted engines kept so a rebuilt engine can resume them
+CHAT_HISTORY_MAX_COUNT = int(os.getenv("CHAT_HISTORY_MAX_COUNT", "1024"))
+
+
+class ChatEngineRegistry:
+    """Process-wide LRU of chat engines, bounded by count and estimated memory
+
+    Engines are keyed by (session_id, doc_name) and remember the index key
+    they were built from, so a re-analyzed document gets a fresh engine.
+    """
+
+    def __init__(self, max_engines=CHAT_ENGINE_MAX_COUNT, max_bytes=CHAT_ENGINE_MAX_BYTES):
+        self.max_engines = max_engines
+        self.max_bytes = max_bytes
+        self._engines = OrderedDict()
+        self._histories = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id, doc_name, key):
+        """Return the cached engine and mark it recently used, or None"""
+        with self._lock:
+            entry = self._engines.get((session_id, doc_name))
+            if entry is None or entry['key'] != key:
+                return None
+            self._engines.move_to_end((session_id, doc_name))
+            return entry['engine']
+
+    def put(self, session_id, doc_name, key, engine, size):
+        """Cache an engine whose index takes roughly size bytes, evicting old engines"""
+        with self._lock:
+            self._remove((session_id, doc_name))
+            self._histories.pop((session_id, doc_name), None)
+            self._engines[(session_id, doc_name)] = {'key': key, 'engine': engine, 'size': size}
+            self._bytes += size
+            # The newest engine always stays, even if it alone exceeds the budget
+            while len(self._engines) > 1 and (
+                len(self._engines) > self.max_engines or self._bytes > self.max_bytes
+            ):
+                self._evict_oldest()
+
+    def evicted_history(self, session_id, doc_name, key):
+        """Chat history of an evicted engine over the same index, or an empty list"""
+        with self._lock:
+            saved = self._histories.get((session_id, doc_name))
+            return list(saved['messages']) if saved and saved['key'] == key else []
+
+    def discard(self, session_id, doc_name):
+        with self._lock:
+            self._remove((session_id, doc_name))
+            self._histories.pop((session_id, doc_name), None)
+
+    def _remove(self, entry_key):
+        entry = self._engines.pop(entry_key, None)
+        if entry is not None:
+            self._bytes -= entry['size']
+        return entry
+
+    def _evict_oldest(self):
+        entry_key, entry = next(iter(self._engines.items()))
+        self._remove(entry_key)
+        self._evictions += 1
+        # Keep the conversation so the engine can be rebuilt where it left off
+        self._histories[entry_key] = {
+            'key': entry['key'],
+            'messages': list(entry['engine'].chat_history)
+        }
+        while len(self._histories) > CHAT_HISTORY_MAX_COUNT:
+            self._histories.popitem(last=False)
+        logger.info(
+            "Evicted chat engine for %s (%.1f MB); %d engines, %.1f MB in memory",
+            entry_key[1], entry['size'] / 1024 ** 2, len(self._engines), self._bytes / 1024 ** 2
+        )
+
+    def session_stats(self, session_id):
+        """Memory gauge for the engines of one session"""
+        with self._lock:
+            sizes = [entry['size'] for (sid, _), entry in self._engines.items() if sid == session_id]
+        return {'engines': len(sizes), 'bytes': sum(sizes)}
+
+    def stats(self):
+        """Memory gauge for the whole process"""
+        with self._lock:
+            return {
+                'engines': len(self._engines),
+                'bytes': self._bytes,
+                'sessions': len({sid for sid, _ in self._engines}),
+                'max_engines': self.max_engines,
+                'max_bytes': self.max_bytes,
+                'evictions': self._evictions
+            }
@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterOperator,
+    VectorStoreQueryResult
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+from analysis_cache import CACHE_DIR
+
+# Corpus configuration
+CORPUS_DB_PATH = os.getenv("CORPUS_DB_PATH", os.path.join(CACHE_DIR, "corpus.db"))
+
+# Node metadata stored as columns, so filters on them run in SQL
+FILTER_COLUMNS = ("doc_key", "doc_name")
+
+
+class CorpusVectorStore(BasePydanticVectorStore):
+    """SQLite vector store holding the embedded chunks of every indexed document
+
+    Chunks carry doc_key and doc_name metadata; queries filtered on them
+    only load the matching embeddings before ranking.
+    """
+
+    stores_text: bool = True
+    path: str = CORPUS_DB_PATH
+
+    _lock = PrivateAttr()
+
+    def __init__(self, path=CORPUS_DB_PATH, **kwargs):
+        super().__init__(path=path, **kwargs)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "    node_id TEXT PRIMARY KEY,"
+                "    ref_doc_id TEXT,"
+                "    doc_key TEXT NOT NULL,"
+                "    doc_name TEXT,"
+                "    node TEXT NOT NULL,"
+                "    embedding BLOB NOT NULL"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_key ON chunks (doc_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_ref_doc ON chunks (ref_doc_id)")
+
+    @classmethod
+    def class_name(cls):
+        return "CorpusVectorStore"
+
+    @property
+    def client(self):
+        return None
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def has(self, doc_key):
+        """True if the chunks of doc_key are already in the corpus"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM chunks WHERE doc_key = ? LIMIT 1", (doc_key,)
+            ).fetchone() is not None
+
+    def add(self, nodes, **kwargs):
+        """Store embedded nodes; nodes already present are left unchanged"""
+        rows = []
+        for node in nodes:
+            metadata = node_to_metadata_dict(node, remove_text=False, flat_metadata=False)
+            rows.append((
+                node.node_id,
+                node.ref_doc_id,
+                node.metadata["doc_key"],
+                node.metadata.get("doc_name"),
+                json.dumps(metadata),
+                np.asarray(node.get_embedding(), dtype=np.float32).tobytes()
+            ))
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO chunks"
+                " (node_id, ref_doc_id, doc_key, doc_name, node, embedding)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id, **kwargs):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE ref_doc_id = ?", (ref_doc_id,))
+
+    def remove(self, doc_key):
+        """Drop every chunk of a document"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE doc_key = ?", (doc_key,))
+
+    def _where(self, filters):
+        if filters is None:
+            return "", []
+        if filters.condition is not None and filters.condition.value != "and" and len(filters.filters) > 1:
+            raise ValueError("Only AND metadata filters are supported")
+        clauses, params = [], []
+        for metadata_filter in filters.filters:
+            if metadata_filter.key not in FILTER_COLUMNS:
+                raise ValueError(f"Unsupported metadata filter key: {metadata_filter.key}")
+            if metadata_filter.operator == FilterOperator.EQ:
+                clauses.append(f"{metadata_filter.key} = ?")
+                params.append(metadata_filter.value)
+            elif metadata_filter.operator == FilterOperator.IN:
+                values = list(metadata_filter.value)
+                if not values:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{metadata_filter.key} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                raise ValueError(f"Unsupported metadata filter operator: {metadata_filter.operator}")
+        return " WHERE " + " AND ".join(clauses), params
+
+    def query(self, query, **kwargs):
+        """Rank the chunks matching the filters by cosine similarity to the query"""
+        where, params = self._where(query.filters)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT node_id, embedding FROM chunks{where}", params).fetchall()
+        if not rows:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        node_ids = [node_id for node_id, _ in rows]
+        matrix = np.frombuffer(b"".join(embedding for _, embedding in rows), dtype=np.float32)
+        matrix = matrix.reshape(len(rows), -1)
+        query_embedding = np.asarray(query.query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_embedding)
+        similarities = matrix @ query_embedding / np.where(norms == 0, 1, norms)
+
+        top = np.argsort(-similarities)[:query.similarity_top_k]
+        top_ids = [node_ids[i] for i in top]
+        # Only the winning chunks are deserialized
+        with self._connect() as conn:
+            stored = dict(conn.execute(
+                f"SELECT node_id, node FROM chunks WHERE node_id IN ({', '.join('?' * len(top_ids))})",
+                top_ids
+            ).fetchall())
+        return VectorStoreQueryResult(
+            nodes=[metadata_dict_to_node(json.loads(stored[node_id])) for node_id in top_ids],
+            similarities=[float(similarities[i]) for i in top],
+            ids=top_ids
+        )
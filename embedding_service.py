@@ -0,0 +1,146 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import torch
+from sentence_transformers import SentenceTransformer
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# Embedding configuration
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_WAIT_MS = int(os.getenv("EMBEDDING_MAX_WAIT_MS", "20"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+
+class EmbeddingService:
+    """Shared sentence-transformers model that batches embedding requests from all sessions"""
+
+    def __init__(
+        self,
+        model_name=EMBEDDING_MODEL,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        max_wait_ms=EMBEDDING_MAX_WAIT_MS,
+        num_threads=EMBEDDING_THREADS
+    ):
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.model = SentenceTransformer(model_name)
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._chunks = 0
+        self._batches = 0
+        self._seconds = 0.0
+
+        self._worker = threading.Thread(
+            target=self._run, name="embedding-service", daemon=True
+        )
+        self._worker.start()
+
+    def embed(self, texts):
+        """Embed texts, blocking until the batch containing them has been computed"""
+        texts = list(texts)
+        if not texts:
+            return []
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _collect_batch(self):
+        # Wait for the first request, then gather others until the batch is full
+        pending = [self._queue.get()]
+        count = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            count += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect_batch()
+            texts = [text for item_texts, _ in pending for text in item_texts]
+            try:
+                start = time.perf_counter()
+                vectors = self.model.encode(
+                    texts,
+                    batch_size=self.batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                )
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self._chunks += len(texts)
+                self._batches += 1
+                self._seconds += elapsed
+            logger.info(
+                "Embedded %d chunks from %d requests in %.2fs (%.1f chunks/sec)",
+                len(texts), len(pending), elapsed, len(texts) / elapsed if elapsed else 0.0
+            )
+
+            offset = 0
+            for item_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(item_texts)].tolist())
+                offset += len(item_texts)
+
+    def stats(self):
+        """Return throughput counters since the service started"""
+        with self._stats_lock:
+            return {
+                'chunks': self._chunks,
+                'batches': self._batches,
+                'seconds': self._seconds,
+                'chunks_per_sec': self._chunks / self._seconds if self._seconds else 0.0,
+                'threads': torch.get_num_threads()
+            }
+
+
+class ServiceEmbedding(BaseEmbedding):
+    """LlamaIndex embedding model backed by a shared EmbeddingService"""
+
+    _service = PrivateAttr()
+
+    def __init__(self, service, **kwargs):
+        super().__init__(
+            model_name=service.model_name,
+            embed_batch_size=min(max(service.batch_size, 1), 2048),
+            **kwargs
+        )
+        self._service = service
+
+    @classmethod
+    def class_name(cls):
+        return "ServiceEmbedding"
+
+    def _get_query_embedding(self, query):
+        return self._service.embed([query])[0]
+
+    async def _aget_query_embedding(self, query):
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text):
+        return self._service.embed([text])[0]
+
+    def _get_text_embeddings(self, texts):
+        return self._service.embed(texts)
@@ -0,0 +1,204 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from analysis_cache import CACHE_DIR
+
+# History configuration
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join(CACHE_DIR, "history.db"))
+
+# Relative bm25 weight of a match in the document name versus its content
+SEARCH_NAME_WEIGHT = 5.0
+# Tokens of context around the matches in a search snippet
+SNIPPET_TOKENS = 16
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching all words, the last one as a prefix"""
+    words = [word.replace('"', '""') for word in text.split()]
+    if not words:
+        return None
+    # Quoting makes FTS5 operators and punctuation in user input literal
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class HistoryStore:
+    """Persistent SQLite store of analyzed and generated documents, kept per owner"""
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(documents)")]
+            if columns and 'owner' not in columns:
+                # History used to be shared by everyone; keep it aside, visible to no one
+                conn.execute("ALTER TABLE documents RENAME TO documents_unowned")
+                conn.execute("DROP TABLE IF EXISTS documents_fts")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "    owner TEXT NOT NULL,"
+                "    name TEXT NOT NULL,"
+                "    type TEXT NOT NULL,"
+                "    content TEXT NOT NULL,"
+                "    status TEXT NOT NULL,"
+                "    timestamp REAL NOT NULL,"
+                "    PRIMARY KEY (owner, name)"
+                ")"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_owner_timestamp ON documents (owner, timestamp)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_documents_owner_type ON documents (owner, type, timestamp)"
+            )
+            # Full-text index over names and content, stored once in documents
+            has_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'"
+            ).fetchone()
+            if not has_fts:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE documents_fts USING fts5("
+                    "    name, content,"
+                    "    content='documents', content_rowid='rowid',"
+                    "    tokenize='porter unicode61'"
+                    ")"
+                )
+                # Index documents saved before full-text search existed
+                conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _unindex(self, conn, owner, name):
+        # External-content FTS tables are updated by replaying the old values
+        row = conn.execute(
+            "SELECT rowid, content FROM documents WHERE owner = ? AND name = ?", (owner, name)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "INSERT INTO documents_fts (documents_fts, rowid, name, content)"
+                " VALUES ('delete', ?, ?, ?)",
+                (row[0], name, row[1])
+            )
+
+    def save(self, owner, name, doc_type, content, timestamp, status="Processed"):
+        """Insert a document, replacing the owner's earlier entry with the same name"""
+        with self._lock, self._connect() as conn:
+            self._unindex(conn, owner, name)
+            conn.execute(
+                "INSERT INTO documents (owner, name, type, content, status, timestamp)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(owner, name) DO UPDATE SET"
+                "   type = excluded.type, content = excluded.content,"
+                "   status = excluded.status, timestamp = excluded.timestamp",
+                (owner, name, doc_type, content, status, timestamp.timestamp())
+            )
+            conn.execute(
+                "INSERT INTO documents_fts (rowid, name, content)"
+                " SELECT rowid, name, content FROM documents WHERE owner = ? AND name = ?",
+                (owner, name)
+            )
+
+    def get(self, owner, name):
+        """Return one of the owner's documents including its content, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT type, content, status, timestamp FROM documents WHERE owner = ? AND name = ?",
+                (owner, name)
+            ).fetchone()
+        if row is None:
+            return None
+        doc_type, content, status, timestamp = row
+        return {
+            'type': doc_type,
+            'content': content,
+            'timestamp': datetime.fromtimestamp(timestamp),
+            'status': status
+        }
+
+    def _where(self, owner, doc_types, start, end):
+        # start is inclusive and end exclusive, both datetimes
+        clauses, params = ["owner = ?"], [owner]
+        if doc_types:
+            clauses.append(f"type IN ({', '.join('?' * len(doc_types))})")
+            params.extend(doc_types)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start.timestamp())
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(end.timestamp())
+        return " WHERE " + " AND ".join(clauses), params
+
+    def list(self, owner, doc_types=None, start=None, end=None, limit=None, offset=0):
+        """Return (name, details) pairs, newest first, without the document content"""
+        where, params = self._where(owner, doc_types, start, end)
+        query = f"SELECT name, type, status, timestamp FROM documents{where} ORDER BY timestamp DESC"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            (name, {
+                'type': doc_type,
+                'timestamp': datetime.fromtimestamp(timestamp),
+                'status': status
+            })
+            for name, doc_type, status, timestamp in rows
+        ]
+
+    def count(self, owner, doc_types=None, start=None, end=None):
+        where, params = self._where(owner, doc_types, start, end)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM documents{where}", params).fetchone()[0]
+
+    def types(self, owner):
+        """Return the distinct document types in the owner's history"""
+        with self._connect() as conn:
+            return [
+                row[0] for row in conn.execute(
+                    "SELECT DISTINCT type FROM documents WHERE owner = ? ORDER BY type", (owner,)
+                )
+            ]
+
+    def search(self, owner, text, limit=20):
+        """Return (name, details) pairs best matching text, with a highlighted snippet"""
+        query = fts_query(text)
+        if query is None:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT d.name, d.type, d.status, d.timestamp,"
+                f"  snippet(documents_fts, 1, '**', '**', ' … ', {SNIPPET_TOKENS})"
+                " FROM documents_fts JOIN documents d ON d.rowid = documents_fts.rowid"
+                " WHERE documents_fts MATCH ? AND d.owner = ?"
+                f" ORDER BY bm25(documents_fts, {SEARCH_NAME_WEIGHT}, 1.0)"
+                " LIMIT ?",
+                (query, owner, limit)
+            ).fetchall()
+        return [
+            (name, {
+                'type': doc_type,
+                'timestamp': datetime.fromtimestamp(timestamp),
+                'status': status,
+                'snippet': snippet
+            })
+            for name, doc_type, status, timestamp, snippet in rows
+        ]
+
+    def delete(self, owner, name):
+        with self._lock, self._connect() as conn:
+            self._unindex(conn, owner, name)
+            conn.execute("DELETE FROM documents WHERE owner = ? AND name = ?", (owner, name))
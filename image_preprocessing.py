@@ -0,0 +1,101 @@
+import io
+import os
+import time
+from PIL import Image, ImageChops, ImageOps, ImageStat
+
+# Preprocessing configuration
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "1") == "1"
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1600"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+
+# Mean HSV saturation (0-255) below which a photo is sent as grayscale
+GRAYSCALE_MAX_SATURATION = 24
+# Pixels differing from the border colour by more than this count as document
+CROP_THRESHOLD = 40
+# Margin kept around the detected document, as a fraction of its size
+CROP_MARGIN = 0.02
+
+
+def preprocessing_settings():
+    """Settings that change the payload, used as part of the analysis cache key"""
+    if not IMAGE_PREPROCESS:
+        return "none"
+    return f"max_side={IMAGE_MAX_SIDE};quality={IMAGE_JPEG_QUALITY}"
+
+
+def _background_level(gray):
+    # Median brightness of the outermost rows and columns
+    width, height = gray.size
+    border = []
+    for box in [(0, 0, width, 1), (0, height - 1, width, height),
+                (0, 0, 1, height), (width - 1, 0, width, height)]:
+        border.extend(gray.crop(box).getdata())
+    border.sort()
+    return border[len(border) // 2]
+
+
+def crop_to_document(image):
+    """Crop away a uniform background around the document, if one is found"""
+    gray = image.convert("L")
+    background = Image.new("L", gray.size, _background_level(gray))
+    mask = ImageChops.difference(gray, background).point(
+        lambda p: 255 if p > CROP_THRESHOLD else 0
+    )
+    bbox = mask.getbbox()
+    if not bbox:
+        return image, False
+
+    left, top, right, bottom = bbox
+    width, height = image.size
+    box_area = (right - left) * (bottom - top)
+    # Skip tiny detections (noise) and boxes that would barely trim anything
+    if box_area < 0.3 * width * height or box_area > 0.95 * width * height:
+        return image, False
+
+    margin_x = int((right - left) * CROP_MARGIN)
+    margin_y = int((bottom - top) * CROP_MARGIN)
+    return image.crop((
+        max(left - margin_x, 0),
+        max(top - margin_y, 0),
+        min(right + margin_x, width),
+        min(bottom + margin_y, height)
+    )), True
+
+
+def is_mostly_gray(image):
+    """True when a photo carries no meaningful colour information"""
+    saturation = image.convert("HSV").getchannel("S")
+    return ImageStat.Stat(saturation).mean[0] < GRAYSCALE_MAX_SATURATION
+
+
+def preprocess_image(image, max_side=IMAGE_MAX_SIDE, quality=IMAGE_JPEG_QUALITY):
+    """Shrink a document photo for the vision model, returning (jpeg_bytes, stats)"""
+    start = time.perf_counter()
+    original_size = image.size
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    image, cropped = crop_to_document(image)
+
+    if max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    grayscale = image.mode == "L" or is_mostly_gray(image)
+    if grayscale:
+        image = image.convert("L")
+
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality, optimize=True)
+    payload = buffered.getvalue()
+
+    return payload, {
+        'original_size': original_size,
+        'size': image.size,
+        'cropped': cropped,
+        'grayscale': grayscale,
+        'bytes': len(payload),
+        'seconds': time.perf_counter() - start
+    }
@@ -0,0 +1,136 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from analysis_cache import CACHE_DIR
+
+# Index store configuration
+INDEX_STORE_DIR = os.getenv("INDEX_STORE_DIR", os.path.join(CACHE_DIR, "indexes"))
+INDEX_STORE_MAX_BYTES = int(os.getenv("INDEX_STORE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Marker file whose mtime records the last time an index was used
+LAST_USED_MARKER = ".last_used"
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class IndexStore:
+    """On-disk store of persisted VectorStoreIndexes keyed by content hash"""
+
+    def __init__(self, root=INDEX_STORE_DIR, max_bytes=INDEX_STORE_MAX_BYTES, on_delete=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        # Called with the key of every deleted index, e.g. to drop copies of its chunks
+        self.on_delete = on_delete
+        self._lock = threading.Lock()
+        # Embedded nodes of indexes still being built, keyed like the store
+        self._partial = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.isdir(self.path(key))
+
+    def size(self, key):
+        """Bytes the persisted index takes on disk, a proxy for its size in memory"""
+        return _dir_size(self.path(key))
+
+    def _touch(self, key):
+        marker = os.path.join(self.path(key), LAST_USED_MARKER)
+        try:
+            with open(marker, "a"):
+                os.utime(marker, None)
+        except OSError:
+            pass
+
+    def publish_partial(self, key, nodes):
+        """Make the nodes embedded so far queryable while the index is still being built"""
+        with self._lock:
+            self._partial[key] = list(nodes)
+
+    def discard_partial(self, key):
+        with self._lock:
+            self._partial.pop(key, None)
+
+    def is_building(self, key):
+        with self._lock:
+            return key in self._partial
+
+    def load(self, key):
+        """Load the index stored under key, or None if it is not stored"""
+        if not self.exists(key):
+            with self._lock:
+                nodes = self._partial.get(key)
+            if not nodes:
+                return None
+            # Nodes already carry embeddings, so this does not re-embed
+            from llama_index.core import VectorStoreIndex
+            return VectorStoreIndex(nodes)
+        from llama_index.core import StorageContext, load_index_from_storage
+        try:
+            storage_context = StorageContext.from_defaults(persist_dir=self.path(key))
+            index = load_index_from_storage(storage_context)
+        except (OSError, ValueError):
+            # Evicted or partially written while we were reading it
+            return None
+        self._touch(key)
+        return index
+
+    def save(self, key, index):
+        """Persist index under key and evict old indexes over the size budget"""
+        tmp_path = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        index.storage_context.persist(persist_dir=tmp_path)
+        try:
+            os.rename(tmp_path, self.path(key))
+        except OSError:
+            # Another session persisted the same content first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self._touch(key)
+        self.evict()
+
+    def delete(self, key):
+        shutil.rmtree(self.path(key), ignore_errors=True)
+        if self.on_delete is not None:
+            self.on_delete(key)
+
+    def evict(self):
+        """Remove least recently used indexes until the store fits its budget"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name.startswith(".tmp-") and time.time() - os.path.getmtime(path) > 3600:
+                    # Left behind by a crash during save()
+                    shutil.rmtree(path, ignore_errors=True)
+                    continue
+                if name.startswith(".") or not os.path.isdir(path):
+                    continue
+                marker = os.path.join(path, LAST_USED_MARKER)
+                try:
+                    last_used = os.path.getmtime(marker)
+                except OSError:
+                    last_used = os.path.getmtime(path)
+                entries.append((last_used, name, _dir_size(path)))
+
+            total = sum(size for _, _, size in entries)
+            now = time.time()
+            for last_used, name, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                # Never evict an index that was just written or loaded
+                if now - last_used < 60:
+                    continue
+                self.delete(name)
+                total -= size
@@ -0,0 +1,207 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from analysis_cache import CACHE_DIR
+
+# Finished jobs nobody collected (e.g. the browser tab was closed) are dropped after this
+JOB_RETENTION_SECONDS = 60 * 60
+# Running jobs of a worker that stopped heartbeating for this long are handed to another worker
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(CACHE_DIR, "jobs.db"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobManager:
+    """Background worker pool whose jobs survive page navigation and reruns"""
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="cividoc-job"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return its job ID"""
+        self._prune()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                'state': QUEUED,
+                'result': None,
+                'error': None,
+                'submitted': time.time(),
+                'finished': None
+            }
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, state=RUNNING)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._update(job_id, state=FAILED, error=str(e), finished=time.time())
+        else:
+            self._update(job_id, state=DONE, result=result, finished=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def status(self, job_id):
+        """Return a snapshot of the job, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def forget(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            for job_id in [
+                job_id for job_id, job in self._jobs.items()
+                if job['finished'] and job['finished'] < cutoff
+            ]:
+                del self._jobs[job_id]
+
+
+class JobQueue:
+    """SQLite job queue shared by the Streamlit server and out-of-process workers
+
+    Pages submit jobs and read results; worker.py claims and runs them.
+    Tasks are referenced by name, so workers resolve them from their own
+    task registry instead of unpickling code.
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, lease_seconds=JOB_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets pages read job status while a worker holds the write lock
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "    id TEXT PRIMARY KEY,"
+                "    task TEXT NOT NULL,"
+                "    payload BLOB,"
+                "    state TEXT NOT NULL,"
+                "    result BLOB,"
+                "    error TEXT,"
+                "    worker TEXT,"
+                "    submitted REAL NOT NULL,"
+                "    heartbeat REAL,"
+                "    finished REAL"
+                ")"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, submitted)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue the task named like fn and return its job ID"""
+        self._prune()
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, task, payload, state, submitted) VALUES (?, ?, ?, ?, ?)",
+                (job_id, fn.__name__, pickle.dumps((args, kwargs)), QUEUED, time.time())
+            )
+        return job_id
+
+    def claim(self, worker):
+        """Take the oldest queued (or abandoned) job, returning (job_id, task, args, kwargs) or None"""
+        now = time.time()
+        with self._connect() as conn:
+            # Serialize claims across worker processes
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, task, payload FROM jobs"
+                " WHERE state = ? OR (state = ? AND heartbeat < ?)"
+                " ORDER BY submitted LIMIT 1",
+                (QUEUED, RUNNING, now - self.lease_seconds)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, task, payload = row
+            conn.execute(
+                "UPDATE jobs SET state = ?, worker = ?, heartbeat = ? WHERE id = ?",
+                (RUNNING, worker, now, job_id)
+            )
+        args, kwargs = pickle.loads(payload)
+        return job_id, task, args, kwargs
+
+    def heartbeat(self, job_id, worker):
+        """Extend the lease of a running job"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND state = ?",
+                (time.time(), job_id, worker, RUNNING)
+            )
+
+    def complete(self, job_id, result):
+        self._finish(job_id, DONE, result=pickle.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, FAILED, error=error)
+
+    def _finish(self, job_id, state, result=None, error=None):
+        # The payload (uploaded file) is no longer needed once the job is done
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?, payload = NULL, finished = ?"
+                " WHERE id = ?",
+                (state, result, error, time.time(), job_id)
+            )
+
+    def status(self, job_id):
+        """Return a snapshot of the job, or None if it is unknown"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT state, result, error, submitted, finished FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        state, result, error, submitted, finished = row
+        return {
+            'state': state,
+            'result': pickle.loads(result) if result is not None else None,
+            'error': error,
+            'submitted': submitted,
+            'finished': finished
+        }
+
+    def forget(self, job_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def _prune(self):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+                (time.time() - JOB_RETENTION_SECONDS,)
+            )
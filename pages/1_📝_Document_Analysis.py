@@ -1,18 +1,20 @@
 import streamlit as st
-from PIL import Image
-import datetime
 from theme import apply_dark_theme, show_page_header, show_footer
 from utils import (
-    process_image, 
-    process_pdf, 
     initialize_session_state, 
-    create_chat_engine,
-    save_to_history,
-    generate_pdf_analysis,
+    submit_analysis_job,
+    collect_finished_jobs,
     process_captured_image,
-    format_analysis_results
+    format_analysis_results,
+    get_embedding_service,
+    analysis_flight,
+    MAX_CONCURRENT_FILES,
+    WORKER_MODE
 )
 
+# Seconds between checks for finished background jobs
+JOB_POLL_SECONDS = 2
+
 # Page config
 st.set_page_config(
     page_title="Document Analysis |  CiviDoc AI",
@@ -120,94 +122,83 @@ def document_analysis_page():
         display_analysis_results()
 
 def process_uploaded_files(files):
-    """Process multiple uploaded files with mobile-friendly progress tracking"""
-    progress_text = "Processing documents..."
-    total_files = len(files)
+    """Queue uploaded files for background analysis"""
+    # Jobs keep running if the user navigates away; results are collected on the Results tab
+    for uploaded_file in files:
+        submit_analysis_job(uploaded_file.name, uploaded_file.type, uploaded_file.getvalue())
     
-    # Progress tracking
-    progress_placeholder = st.empty()
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    # In queue mode the number of worker.py processes sets the concurrency
+    concurrency = f", up to {MAX_CONCURRENT_FILES} analyzed at a time" if WORKER_MODE == "thread" else ""
+    st.markdown(
+        f"<div class='status-badge status-warning' style='margin: 1rem 0;'>"
+        f"⏳ {len(files)} file(s) queued{concurrency}. "
+        f"Follow progress on the Results tab."
+        f"</div>",
+        unsafe_allow_html=True
+    )
     
-    for idx, uploaded_file in enumerate(files, 1):
-        try:
-            # Update progress
-            progress_placeholder.markdown(
-                f"<div style='text-align: center; margin: 1rem 0;'>"
-                f"Processing file {idx} of {total_files}"
-                f"</div>",
-                unsafe_allow_html=True
-            )
-            
-            status_text.markdown(
-                f"<div class='status-badge status-warning'>"
-                f"📝 Processing: {uploaded_file.name}"
-                f"</div>",
-                unsafe_allow_html=True
-            )
-            
-            if uploaded_file.type in ['image/jpeg', 'image/png']:
-                # Process image
-                image = Image.open(uploaded_file)
-                analysis = process_image(image)
-                
-                # Save results
-                st.session_state.analyses[uploaded_file.name] = {
-                    'type': uploaded_file.type,
-                    'analysis': analysis,
-                    'timestamp': datetime.now()
-                }
-                
-                # Create chat engine
-                st.session_state.chat_engines[uploaded_file.name] = create_chat_engine(analysis)
-                
-            elif uploaded_file.type == 'application/pdf':
-                # Process PDF
-                documents = process_pdf(uploaded_file)
-                analysis = generate_pdf_analysis(documents)
-                
-                # Save results
-                st.session_state.analyses[uploaded_file.name] = {
-                    'type': uploaded_file.type,
-                    'analysis': analysis,
-                    'timestamp': datetime.now()
-                }
-                
-                # Create chat engine
-                st.session_state.chat_engines[uploaded_file.name] = create_chat_engine(documents)
-            
-            # Update progress
-            progress_bar.progress(idx/total_files)
-            
-            # Save to history
-            save_to_history(
-                uploaded_file.name,
-                uploaded_file.type.split('/')[1].upper(),
-                analysis,
-                datetime.now()
-            )
-            
-        except Exception as e:
-            st.error(
-                f"❌ Error processing {uploaded_file.name}\n"
-                f"Details: {str(e)}"
-            )
     
-    # Clear progress indicators
-    progress_placeholder.empty()
-    progress_bar.empty()
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress():
+    """Poll background jobs and show their progress without rerunning the page"""
+    if collect_finished_jobs() and not st.session_state.jobs:
+        # Last job finished: rerun the page to show its results and stop polling
+        st.rerun()
+    
+    pending = st.session_state.jobs
+    if not pending:
+        return
     
-    # Show completion message
-    status_text.markdown(
-        "<div class='status-badge status-success' style='margin: 1rem 0;'>"
-        "✅ All documents processed successfully!"
-        "</div>",
+    st.markdown(
+        f"<div style='text-align: center; margin: 1rem 0;'>"
+        f"Processing {len(pending)} file(s)"
+        f"</div>",
         unsafe_allow_html=True
     )
+    for job in pending.values():
+        st.markdown(
+            f"<div class='status-badge status-warning'>"
+            f"📝 Analyzing: {job['name']}"
+            f"</div>",
+            unsafe_allow_html=True
+        )
+
+def show_job_errors():
+    """Show analyses that failed in the background"""
+    for file_name, error in st.session_state.job_errors.items():
+        st.error(
+            f"❌ Error processing {file_name}\n"
+            f"Details: {error}"
+        )
+    if st.session_state.job_errors and st.button("Dismiss errors", use_container_width=True):
+        st.session_state.job_errors = {}
+        st.rerun()
+
+def show_processing_stats():
+    """Show embedding throughput and single-flight counters"""
+    # Embedding throughput, used to size CPU nodes
+    stats = get_embedding_service().stats()
+    if stats['chunks']:
+        st.caption(
+            f"Embedding throughput: {stats['chunks_per_sec']:.1f} chunks/sec "
+            f"({stats['chunks']} chunks in {stats['batches']} batches, "
+            f"{stats['threads']} threads)"
+        )
     
+    # Identical documents analyzed at the same time share one Groq call
+    flight_stats = analysis_flight.stats()
+    st.caption(
+        f"Groq analyses issued: {flight_stats['issued']}, "
+        f"coalesced with an identical in-flight analysis: {flight_stats['coalesced']}"
+    )
     
 def display_analysis_results():
     """Display analysis results with mobile-friendly layout"""
+    # Only poll while this session has jobs running
+    if st.session_state.jobs:
+        show_job_progress()
+    show_job_errors()
+    
     if st.session_state.analyses:
         
         # Display results
@@ -226,7 +217,10 @@ def display_analysis_results():
                     f"</div>",
                     unsafe_allow_html=True
                 )
-    else:
+        # Counters are per process, so they only describe in-process jobs
+        if WORKER_MODE == "thread":
+            show_processing_stats()
+    elif not st.session_state.jobs:
         st.markdown(
             "<div class='card' style='text-align: center;'>"
             "<h3>No Documents Analyzed</h3>"
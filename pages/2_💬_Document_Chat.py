@@ -1,6 +1,6 @@
 import streamlit as st
 from theme import apply_dark_theme, show_page_header, show_footer
-from utils import initialize_session_state
+from utils import initialize_session_state, stream_chat, chat_memory_stats, answer_cache_stats, get_chat_session, reset_chat, ALL_DOCUMENTS
 
 # Page config
 st.set_page_config(
@@ -14,6 +14,9 @@ st.set_page_config(
 # Apply dark theme
 st.markdown(apply_dark_theme(), unsafe_allow_html=True)
 
+# Messages rendered per rerun; older ones are revealed on demand
+CHAT_RENDER_WINDOW = 20
+
 def document_chat_page():
     # Initialize states
     initialize_session_state()
@@ -24,7 +27,7 @@ def document_chat_page():
         "Get instant answers about your documents"
     ), unsafe_allow_html=True)
     
-    if st.session_state.chat_engines:
+    if st.session_state.index_keys:
         # Document selector - Mobile friendly
         st.markdown(
             "<div class='card'>"
@@ -32,12 +35,15 @@ def document_chat_page():
             unsafe_allow_html=True
         )
         
-        doc_names = list(st.session_state.chat_engines.keys())
+        doc_names = list(st.session_state.index_keys.keys())
+        # Questions across documents are answered from one corpus-wide index
+        if len(doc_names) > 1:
+            doc_names.insert(0, ALL_DOCUMENTS)
         selected_doc = st.selectbox(
             "Choose a document to discuss:",
             doc_names,
             key="doc_selector",
-            format_func=lambda x: f"📄 {x}"
+            format_func=lambda x: x if x == ALL_DOCUMENTS else f"📄 {x}"
         )
         
         st.markdown("</div>", unsafe_allow_html=True)
@@ -51,14 +57,18 @@ def document_chat_page():
                         unsafe_allow_html=True
                     )
             
-            # Initialize chat history for selected document
-            if 'messages' not in st.session_state:
-                st.session_state.messages = [
-                    {"role": "assistant", "content": f"Hello! I'm here to help you understand {selected_doc}. What would you like to know?"}
-                ]
+            # Each document keeps its own conversation, restored when it is reselected
+            chat_session = get_chat_session(selected_doc)
+            messages = chat_session['messages']
             
-            # Display chat messages
-            for message in st.session_state.messages:
+            # Display only the latest messages, so reruns stay fast in long conversations
+            window = chat_session.setdefault('window', CHAT_RENDER_WINDOW)
+            hidden = len(messages) - window
+            if hidden > 0:
+                if st.button(f"⬆️ Show earlier messages ({hidden} hidden)", use_container_width=True):
+                    chat_session['window'] += CHAT_RENDER_WINDOW
+                    st.rerun()
+            for message in messages[-window:]:
                 with st.chat_message(message["role"]):
                     st.write(message["content"])
             
@@ -68,16 +78,29 @@ def document_chat_page():
                 handle_user_input(prompt, selected_doc)
             
             # Clear chat button
-            if len(st.session_state.messages) > 1:
+            if len(messages) > 1:
                 if st.button("🗑️ Clear Chat", use_container_width=True):
                     # Reset to initial welcome message
-                    st.session_state.messages = [
-                    {"role": "assistant", "content": f"Hello! I'm here to help you understand {selected_doc}. What would you like to know?"}
-                    ]
-                    for message in st.session_state.messages:
-                        with st.chat_message(message["role"]):
-                            st.write(message["content"])
-                            st.rerun()
+                    reset_chat(selected_doc)
+                    st.rerun()
+            
+            # Engines are evicted least recently used first once the server budget is reached
+            session_stats, server_stats = chat_memory_stats()
+            st.caption(
+                f"Chat engines in memory: {session_stats['engines']} for this session "
+                f"({session_stats['bytes'] / 1024 ** 2:.1f} MB), "
+                f"{server_stats['engines']}/{server_stats['max_engines']} on the server "
+                f"({server_stats['bytes'] / 1024 ** 2:.1f}/{server_stats['max_bytes'] / 1024 ** 2:.0f} MB, "
+                f"{server_stats['evictions']} evicted)"
+            )
+            
+            # Repeated questions are answered from the semantic cache
+            cache_stats = answer_cache_stats()
+            if cache_stats['lookups']:
+                st.caption(
+                    f"Answer cache: {cache_stats['hits']}/{cache_stats['lookups']} questions "
+                    f"answered from cache ({cache_stats['hit_rate']:.0%} hit rate)"
+                )
     
     else:
         # No documents message
@@ -96,8 +119,10 @@ def document_chat_page():
 
 def handle_user_input(prompt, selected_doc):
     """Handle user input with loading states and error handling"""
+    messages = get_chat_session(selected_doc)['messages']
+    
     # Add user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    messages.append({"role": "user", "content": prompt})
     
     # Display user message
     with st.chat_message("user"):
@@ -105,28 +130,27 @@ def handle_user_input(prompt, selected_doc):
     
     # Generate and display assistant response
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                chat_engine = st.session_state.chat_engines[selected_doc]
-                response = chat_engine.chat(prompt)
-                assistant_response = response.response
-                
-                # Add assistant response to messages
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": assistant_response
-                })
-                
-                # Display response
-                st.write(assistant_response)
+        try:
+            with st.spinner("Thinking..."):
+                response = stream_chat(selected_doc, prompt)
             
-            except Exception as e:
-                error_message = f"Sorry, I encountered an error: {str(e)}"
-                st.error(error_message)
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": error_message
-                })
+            # Display response as tokens arrive
+            assistant_response = st.write_stream(response)
+            
+            # Add assistant response to messages
+            messages.append({
+                "role": "assistant",
+                "content": assistant_response
+            })
+        
+        except Exception as e:
+            error_message = f"Sorry, I encountered an error: {str(e)}"
+            st.error(error_message)
+            messages.append({
+                "role": "assistant",
+                "content": error_message,
+                "error": True
+            })
                 
 if __name__ == "__main__":
     document_chat_page()
@@ -1,6 +1,6 @@
 import streamlit as st
 from theme import apply_dark_theme, show_page_header, show_footer
-from utils import initialize_session_state, generate_document, save_to_history
+from utils import initialize_session_state, stream_document, save_to_history
 from datetime import datetime
 
 # Page config
@@ -327,44 +327,46 @@ def validate_and_generate(doc_type, fields):
             return False
         
         try:
-            with st.spinner("Generating document..."):
-                # Generate document
-                generated_content = generate_document(doc_type, fields)
-                
-                # Save to history
-                timestamp = datetime.now()
-                doc_name = f"{doc_type}_{timestamp.strftime('%Y%m%d_%H%M%S')}"
-                save_to_history(doc_name, doc_type, generated_content, timestamp)
-                
-                # Show success message
-                st.success("Document generated successfully!")
-                
-                # Display generated document
-                st.markdown(
-                    "<div class='card'>"
-                    "<h4>Generated Document</h4>"
-                    f"<pre style='white-space: pre-wrap;'>{generated_content}</pre>"
-                    "</div>",
-                    unsafe_allow_html=True
+            # Stream the document as it is generated
+            stream_placeholder = st.empty()
+            with stream_placeholder.container():
+                generated_content = st.write_stream(stream_document(doc_type, fields))
+            stream_placeholder.empty()
+            
+            # Save to history
+            timestamp = datetime.now()
+            doc_name = f"{doc_type}_{timestamp.strftime('%Y%m%d_%H%M%S')}"
+            save_to_history(doc_name, doc_type, generated_content, timestamp)
+            
+            # Show success message
+            st.success("Document generated successfully!")
+            
+            # Display generated document
+            st.markdown(
+                "<div class='card'>"
+                "<h4>Generated Document</h4>"
+                f"<pre style='white-space: pre-wrap;'>{generated_content}</pre>"
+                "</div>",
+                unsafe_allow_html=True
+            )
+            
+            # Action buttons
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    "📥 Download Document",
+                    generated_content,
+                    file_name=f"{doc_name}.txt",
+                    mime="text/plain",
+                    use_container_width=True
                 )
-                
-                # Action buttons
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.download_button(
-                        "📥 Download Document",
-                        generated_content,
-                        file_name=f"{doc_name}.txt",
-                        mime="text/plain",
-                        use_container_width=True
-                    )
-                
-                with col2:
-                    if st.button("📋 Create Another", use_container_width=True):
-                        st.rerun()
-                
-                return True
-                
+            
+            with col2:
+                if st.button("📋 Create Another", use_container_width=True):
+                    st.rerun()
+            
+            return True
+            
         except Exception as e:
             st.error(f"Error generating document: {str(e)}")
             return False
@@ -1,7 +1,12 @@
+import math
+import time
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-from utils import initialize_session_state, get_document_history, delete_from_history, format_timestamp, format_analysis_results
+from datetime import datetime, timedelta
+from utils import initialize_session_state, get_document_history, count_document_history, get_document_types, get_document, search_history, delete_from_history, format_timestamp, format_analysis_results
+
+# History entries shown per page
+HISTORY_PAGE_SIZE = 25
 
 def display_document_content(content):
     """Display formatted document content"""
@@ -12,81 +17,122 @@ def display_document_content(content):
         f"</div>",
         unsafe_allow_html=True
     )
+def show_search_results(search_text):
+    """Show ranked full-text matches with highlighted snippets"""
+    start = time.perf_counter()
+    results = search_history(search_text)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    if not results:
+        st.info("No documents match your search.")
+        return results
+    
+    st.caption(f"{len(results)} best matches in {elapsed_ms:.0f} ms")
+    for doc_name, details in results.items():
+        st.markdown(
+            f"**{doc_name}** · {details['type']} · {format_timestamp(details['timestamp'])}  \n"
+            f"{details['snippet']}"
+        )
+    return results
+
+def show_filtered_history():
+    """Show one page of history filtered by type and date"""
+    # Filtering and pagination run in the history store; only one page is loaded
+    col1, col2 = st.columns(2)
+    with col1:
+        doc_type_filter = st.multiselect(
+            "Filter by Document Type",
+            options=get_document_types(),
+            default=[]
+        )
+    
+    with col2:
+        date_range = st.date_input(
+            "Filter by Date Range",
+            value=(datetime.now().date(), datetime.now().date()),
+            key="date_range"
+        )
+    
+    start = end = None
+    if len(date_range) == 2:
+        start = datetime.combine(date_range[0], datetime.min.time())
+        end = datetime.combine(date_range[1] + timedelta(days=1), datetime.min.time())
+    
+    matching = count_document_history(doc_type_filter, start, end)
+    if not matching:
+        st.info("No documents match the selected filters.")
+        return {}
+    
+    page_count = math.ceil(matching / HISTORY_PAGE_SIZE)
+    page = 1
+    if page_count > 1:
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    offset = (page - 1) * HISTORY_PAGE_SIZE
+    history = get_document_history(doc_type_filter, start, end, HISTORY_PAGE_SIZE, offset)
+    
+    filtered_df = pd.DataFrame([
+        {
+            'Document Name': doc_name,
+            'Type': details['type'],
+            'Date': details['timestamp'],
+            'Status': details['status']
+        }
+        for doc_name, details in history.items()
+    ])
+    st.caption(f"Showing {offset + 1}-{offset + len(history)} of {matching} documents")
+    
+    # Display interactive table
+    st.dataframe(
+        filtered_df,
+        column_config={
+            "Document Name": st.column_config.TextColumn(
+                "Document Name",
+                width="medium",
+            ),
+            "Type": st.column_config.TextColumn(
+                "Type",
+                width="small",
+            ),
+            "Date": st.column_config.DatetimeColumn(
+                "Processing Date",
+                format="YYYY-MM-DD HH:mm:ss",
+                width="small",
+            ),
+            "Status": st.column_config.TextColumn(
+                "Status",
+                width="small",
+            ),
+        },
+        hide_index=True,
+    )
+    
+    return history
+
 def document_history_page():
     st.title("📚 Document History")
     initialize_session_state()
     
-    # Create DataFrame from document history
-    if st.session_state.document_history:
-        history_data = []
-        for doc_name, details in get_document_history().items():
-            history_data.append({
-                'Document Name': doc_name,
-                'Type': details['type'],
-                'Date': format_timestamp(details['timestamp']),
-                'Status': details['status']
-            })
-        
-        df = pd.DataFrame(history_data)
-        
-        # Filters
-        col1, col2 = st.columns(2)
-        with col1:
-            doc_type_filter = st.multiselect(
-                "Filter by Document Type",
-                options=df['Type'].unique(),
-                default=[]
-            )
-        
-        with col2:
-            date_range = st.date_input(
-                "Filter by Date Range",
-                value=(datetime.now().date(), datetime.now().date()),
-                key="date_range"
-            )
-        
-        # Apply filters
-        filtered_df = df.copy()
-        if doc_type_filter:
-            filtered_df = filtered_df[filtered_df['Type'].isin(doc_type_filter)]
-        if len(date_range) == 2:
-            filtered_df['Date'] = pd.to_datetime(filtered_df['Date'])
-            mask = (filtered_df['Date'].dt.date >= date_range[0]) & (filtered_df['Date'].dt.date <= date_range[1])
-            filtered_df = filtered_df[mask]
-        
-        # Display interactive table
-        st.dataframe(
-            filtered_df,
-            column_config={
-                "Document Name": st.column_config.TextColumn(
-                    "Document Name",
-                    width="medium",
-                ),
-                "Type": st.column_config.TextColumn(
-                    "Type",
-                    width="small",
-                ),
-                "Date": st.column_config.TextColumn(
-                    "Processing Date",
-                    width="small",
-                ),
-                "Status": st.column_config.TextColumn(
-                    "Status",
-                    width="small",
-                ),
-            },
-            hide_index=True,
+    if count_document_history():
+        search_text = st.text_input(
+            "🔍 Search documents",
+            placeholder="Search names and content, e.g. lease deposit"
         )
+        if search_text.strip():
+            history = show_search_results(search_text)
+        else:
+            history = show_filtered_history()
+        if not history:
+            return
         
         # Document Details Section
         st.subheader("Document Details")
         selected_doc = st.selectbox(
             "Select a document to view details",
-            options=df['Document Name'].tolist()
+            options=list(history)
         )
         
         if selected_doc:
-            doc_details = st.session_state.document_history[selected_doc]
+            doc_details = get_document(selected_doc)
             
             col1, col2, col3 = st.columns([2,2,1])
             with col1:
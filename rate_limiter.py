@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Groq account limits, applied per model
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "20000"))
+# Fraction of the account limits this process may use, when several processes share them
+GROQ_BUDGET_SHARE = float(os.getenv("GROQ_BUDGET_SHARE", "1"))
+# Share of each budget that only interactive requests (chat, live generation) may use
+INTERACTIVE_RESERVE = float(os.getenv("GROQ_INTERACTIVE_RESERVE", "0.2"))
+
+# Retry schedule for 429 and 5xx responses
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "5"))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+
+class TokenBucket:
+    """Bucket refilled continuously up to capacity"""
+
+    def __init__(self, capacity, per_minute):
+        self.capacity = capacity
+        self.rate = per_minute / 60
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, floor):
+        """Seconds until amount can be taken without dropping below floor"""
+        missing = amount + floor - self.level
+        return max(missing, 0) / self.rate if self.rate else 0.0
+
+
+class RateLimiter:
+    """Requests- and tokens-per-minute budget for one model"""
+
+    def __init__(self, rpm=GROQ_RPM, tpm=GROQ_TPM, interactive_reserve=INTERACTIVE_RESERVE):
+        self.requests = TokenBucket(rpm, rpm)
+        self.tokens = TokenBucket(tpm, tpm)
+        self.interactive_reserve = interactive_reserve
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens, priority=BATCH):
+        """Take budget for one request, or return the seconds to wait before retrying"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.requests.refill(now)
+            self.tokens.refill(now)
+
+            # A prompt larger than the whole budget waits for a full bucket
+            tokens = min(tokens, self.tokens.capacity)
+            reserve = 0.0 if priority == INTERACTIVE else self.interactive_reserve
+            wait = max(
+                self.requests.wait_time(1, min(reserve * self.requests.capacity, self.requests.capacity - 1)),
+                self.tokens.wait_time(tokens, min(reserve * self.tokens.capacity, self.tokens.capacity - tokens))
+            )
+            if wait > 0:
+                return wait
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+            return 0.0
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once the response reports real usage"""
+        with self._lock:
+            self.tokens.level -= actual - estimated
+
+    def pause(self, seconds):
+        """Hold every request for this model, e.g. after a 429 with retry-after"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _retry_delay(error, attempt):
+    # Honour retry-after when Groq sends one, otherwise use full-jitter backoff
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return float(retry_after)
+    except ValueError:
+        pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def is_retryable(error):
+    """True for rate limiting, server errors and dropped connections"""
+    import groq
+    import openai
+    # Chat goes through LlamaIndex's Groq LLM, which raises the openai SDK's errors
+    if isinstance(error, (groq.APIStatusError, openai.APIStatusError)):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (groq.APIConnectionError, openai.APIConnectionError))
+
+
+class RateLimiterRegistry:
+    """Process-wide scheduler for Groq calls, with one rate limiter per model"""
+
+    def __init__(self, share=GROQ_BUDGET_SHARE):
+        # Applies to limiters created after it is set, so set it before the first call
+        self.share = share
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        with self._lock:
+            if model not in self._limiters:
+                self._limiters[model] = RateLimiter(GROQ_RPM * self.share, GROQ_TPM * self.share)
+            return self._limiters[model]
+
+    def settle(self, model, estimated, actual):
+        self.get(model).settle(estimated, actual)
+
+    def _should_retry(self, model, error, attempt):
+        if attempt == GROQ_MAX_RETRIES or not is_retryable(error):
+            return None
+        delay = _retry_delay(error, attempt)
+        if getattr(error, "status_code", None) == 429:
+            self.get(model).pause(delay)
+        logger.warning(
+            "Groq %s request failed (%s), retry %d/%d in %.1fs",
+            model, getattr(error, "status_code", type(error).__name__),
+            attempt + 1, GROQ_MAX_RETRIES, delay
+        )
+        return delay
+
+    def call(self, model, tokens, call, priority=BATCH):
+        """Run a blocking Groq call within the model's budget, retrying 429 and 5xx"""
+        limiter = self.get(model)
+        for attempt in range(GROQ_MAX_RETRIES + 1):
+            while (delay := limiter.reserve(tokens, priority)) > 0:
+                time.sleep(delay)
+            try:
+                return call()
+            except Exception as e:
+                delay = self._should_retry(model, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def acall(self, model, tokens, call, priority=BATCH):
+        """Await a Groq call within the model's budget, retrying 429 and 5xx"""
+        limiter = self.get(model)
+        for attempt in range(GROQ_MAX_RETRIES + 1):
+            while (delay := limiter.reserve(tokens, priority)) > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await call()
+            except Exception as e:
+                delay = self._should_retry(model, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
@@ -0,0 +1,54 @@
+import json
+import os
+
+# Chunking and retrieval settings per kind of indexed document:
+#   image - the analysis of one photo, a few hundred words of markdown
+#   pdf   - parsed pages, often long and repetitive
+#   text  - any other content passed to create_chat_engine
+# All start from LlamaIndex's defaults; change them only with numbers from
+# benchmarks/retrieval_benchmark.py run against the real embedding model
+RETRIEVAL_PROFILES = {
+    'image': {'chunk_size': 1024, 'chunk_overlap': 200, 'top_k': 2, 'similarity_cutoff': None},
+    'pdf': {'chunk_size': 1024, 'chunk_overlap': 200, 'top_k': 2, 'similarity_cutoff': None},
+    'text': {'chunk_size': 1024, 'chunk_overlap': 200, 'top_k': 2, 'similarity_cutoff': None}
+}
+DEFAULT_PROFILE = 'text'
+
+# Per-profile overrides as JSON, e.g. {"pdf": {"top_k": 6}}
+RETRIEVAL_PROFILES_JSON = os.getenv("RETRIEVAL_PROFILES_JSON")
+if RETRIEVAL_PROFILES_JSON:
+    for _name, _overrides in json.loads(RETRIEVAL_PROFILES_JSON).items():
+        RETRIEVAL_PROFILES.setdefault(_name, dict(RETRIEVAL_PROFILES[DEFAULT_PROFILE])).update(_overrides)
+
+
+def get_profile(name):
+    """Settings of a retrieval profile, falling back to the default one"""
+    return RETRIEVAL_PROFILES.get(name, RETRIEVAL_PROFILES[DEFAULT_PROFILE])
+
+
+def chunking_settings(name):
+    """Settings that change the persisted index, used as part of its key"""
+    profile = get_profile(name)
+    return f"chunk_size={profile['chunk_size']};chunk_overlap={profile['chunk_overlap']}"
+
+
+def profile_for_key(key):
+    """Profile an index key was built with; keys carry it as a prefix"""
+    name = key.split("-", 1)[0]
+    return name if name in RETRIEVAL_PROFILES else DEFAULT_PROFILE
+
+
+def make_node_parser(name):
+    from llama_index.core.node_parser import SentenceSplitter
+    profile = get_profile(name)
+    return SentenceSplitter(
+        chunk_size=profile['chunk_size'],
+        chunk_overlap=profile['chunk_overlap']
+    )
+
+
+def make_postprocessors(name):
+    """Node postprocessors dropping retrieved chunks below the profile's cutoff"""
+    from llama_index.core.postprocessor import SimilarityPostprocessor
+    cutoff = get_profile(name)['similarity_cutoff']
+    return [SimilarityPostprocessor(similarity_cutoff=cutoff)] if cutoff else []
@@ -0,0 +1,35 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task
+
+    All callers must run on the same event loop; the shared Groq loop in
+    utils makes this process-wide.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.issued = 0
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        """Await the in-flight call for key, starting factory() if there is none"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.issued += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled waiter must not cancel the call other sessions are waiting on
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """Return counters of issued versus coalesced calls"""
+        return {
+            'issued': self.issued,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._inflight)
+        }
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault("CIVIDOC_CACHE_DIR", tempfile.mkdtemp())
+
+import utils
+from utils import astream_sections, asummarize_streamed_analysis
+
+
+def split_sections(text, token_size=7):
+    """Run astream_sections over text streamed in small tokens"""
+    async def tokens():
+        for start in range(0, len(text), token_size):
+            yield text[start:start + token_size]
+
+    async def collect():
+        return [section async for section in astream_sections(tokens())]
+
+    return asyncio.run(collect())
+
+
+def test_splits_on_top_level_headings():
+    text = (
+        "**1. Document Type and Purpose:**\nA tax bill.\n\n"
+        "**2. Key Requirements:**\nPay the tax.\n\n"
+        "**3. Important Deadlines:**\nNovember 1."
+    )
+    sections = split_sections(text)
+    assert len(sections) == 3
+    assert sections[0].startswith("**1. Document Type")
+    assert sections[2].endswith("November 1.")
+
+
+def test_numbered_list_stays_inside_its_section():
+    text = (
+        "1. Document Type and Purpose:\nA renewal form.\n\n"
+        "5. Required Actions:\n"
+        "1. Sign the form.\n"
+        "2. Attach a photo.\n"
+        "   3. Include your old passport.\n"
+        "6. Mail everything.\n\n"
+        "6. Contact Information:\nThe passport agency."
+    )
+    sections = split_sections(text)
+    assert len(sections) == 3
+    assert "2. Attach a photo." in sections[1]
+    assert "6. Mail everything." in sections[1]
+    assert sections[2].startswith("6. Contact Information")
+
+
+def test_text_before_first_heading_joins_first_section():
+    sections = split_sections("Here is the analysis.\n\n1. Document Type and Purpose:\nA notice.")
+    assert len(sections) == 1
+    assert sections[0].startswith("Here is the analysis.")
+
+
+def test_failed_analysis_cancels_section_summaries(monkeypatch):
+    cancelled = []
+
+    async def slow_summary(text, prompt):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(text)
+            raise
+
+    async def failing_stream():
+        yield "1. Document Type and Purpose:\nA notice.\n"
+        yield "2. Key Requirements:\nPay.\n"
+        # Let the first section's summary start before the stream fails
+        await asyncio.sleep(0)
+        raise RuntimeError("stream dropped")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await asummarize_streamed_analysis(failing_stream())
+        await asyncio.sleep(0)
+        # Cancelled by the summarizer, not by asyncio.run shutting down
+        assert len(cancelled) == 1
+
+    monkeypatch.setattr(utils, "asummarize", slow_summary)
+    asyncio.run(run())
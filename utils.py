@@ -1,45 +1,309 @@
 import streamlit as st
-from groq import Groq
 import io
 import base64
 import re
 import os
+import logging
+import asyncio
+import threading
+import time
+import queue
+import itertools
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from llama_index.core import VectorStoreIndex, Settings, Document
-from llama_index.readers.file import PDFReader
-from llama_index.llms.groq import Groq as LlamaGroq
-from llama_index.embeddings.langchain import LangchainEmbedding
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from datetime import datetime
 from PIL import Image
 import gettext
+from analysis_cache import AnalysisCache, make_cache_key
+from index_store import IndexStore
+from history_store import HistoryStore
+from chat_registry import ChatEngineRegistry
+from retrieval_profiles import (
+    get_profile,
+    chunking_settings,
+    profile_for_key,
+    make_node_parser,
+    make_postprocessors
+)
+from singleflight import SingleFlight
+from rate_limiter import RateLimiterRegistry, INTERACTIVE, BATCH
+from image_preprocessing import IMAGE_PREPROCESS, preprocess_image, preprocessing_settings
+from jobs import JobManager, JobQueue, DONE, FAILED
 
-# Load environment variables and configure
+# Load environment variables; heavy clients and models are created on first use
 load_dotenv()
+logging.basicConfig(level=os.getenv("CIVIDOC_LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
 groq_api_key = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=groq_api_key)
 
-# Configure LlamaIndex
-Settings.llm = LlamaGroq(api_key=groq_api_key, model="llama-3.2-90b-vision-preview")
-lc_embed_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2"
+# Connection pool of the shared async Groq client
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "100"))
+GROQ_MAX_KEEPALIVE = int(os.getenv("GROQ_MAX_KEEPALIVE", "20"))
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "120"))
+
+_llama_index_lock = threading.Lock()
+_llama_index_configured = False
+
+@contextmanager
+def log_load_time(resource):
+    """Log how long it took to load a lazily initialized resource"""
+    start = time.perf_counter()
+    yield
+    logger.info("Loaded %s in %.2fs", resource, time.perf_counter() - start)
+
+@st.cache_resource
+def get_groq_client():
+    """Groq client shared by every session in this server process"""
+    with log_load_time("Groq client"):
+        from groq import Groq
+        # Retries are handled by groq_scheduler, which also respects the rate limits
+        return Groq(api_key=groq_api_key, max_retries=0)
+
+@st.cache_resource
+def get_event_loop():
+    """Event loop on a daemon thread that runs the async Groq calls of every session"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="groq-event-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource
+def get_async_groq_client():
+    """Async Groq client with a pooled keep-alive connection, shared by every session"""
+    with log_load_time("async Groq client"):
+        import httpx
+        from groq import AsyncGroq
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=GROQ_MAX_CONNECTIONS,
+                max_keepalive_connections=GROQ_MAX_KEEPALIVE
+            ),
+            timeout=GROQ_TIMEOUT
+        )
+        return AsyncGroq(
+            api_key=groq_api_key,
+            http_client=http_client,
+            timeout=GROQ_TIMEOUT,
+            max_retries=0
+        )
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and block until it finishes"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+@st.cache_resource
+def get_embedding_service():
+    """Embedding model shared by every session in this server process"""
+    with log_load_time("embedding model"):
+        from embedding_service import EmbeddingService
+        return EmbeddingService()
+
+@st.cache_resource
+def get_corpus_store():
+    """Vector store over the chunks of every indexed document"""
+    from corpus_index import CorpusVectorStore
+    return CorpusVectorStore()
+
+@st.cache_resource
+def get_summary_llm():
+    """Small Groq model that condenses older chat turns"""
+    from llama_index.llms.groq import Groq as LlamaGroq
+    # Called within the scheduled chat turn, which retries it with the turn
+    return LlamaGroq(api_key=groq_api_key, model=SUMMARY_MODEL, max_retries=0)
+
+@st.cache_resource
+def get_chat_registry():
+    """Chat engines of every session, bounded in count and memory"""
+    return ChatEngineRegistry()
+
+@st.cache_resource
+def get_answer_cache():
+    """Semantic cache of chat answers, shared by every session"""
+    from answer_cache import AnswerCache
+    return AnswerCache()
+
+@st.cache_resource
+def get_job_manager():
+    """Job backend shared by every session so jobs outlive reruns"""
+    if WORKER_MODE == "queue":
+        # Jobs are run by separate worker.py processes
+        return JobQueue()
+    return JobManager(max_workers=MAX_CONCURRENT_FILES)
+
+def configure_llama_index():
+    """Configure the LlamaIndex LLM and embedding model on first use"""
+    global _llama_index_configured
+    with _llama_index_lock:
+        if _llama_index_configured:
+            return
+        with log_load_time("LlamaIndex settings"):
+            from llama_index.core import Settings
+            from llama_index.llms.groq import Groq as LlamaGroq
+            from embedding_service import ServiceEmbedding
+            # Retries are left to groq_scheduler, like for the Groq client
+            Settings.llm = LlamaGroq(api_key=groq_api_key, model=VISION_MODEL, max_retries=0)
+            Settings.embed_model = ServiceEmbedding(get_embedding_service())
+        _llama_index_configured = True
+
+# Models and prompts (part of every analysis cache key)
+VISION_MODEL = "llama-3.2-90b-vision-preview"
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+
+IMAGE_ANALYSIS_PROMPT = """Please analyze this government document and provide:
+                        1. Document type and purpose
+                        2. Key requirements and deadlines
+                        3. Complex terms explained simply
+                        4. Required actions or next steps
+                        5. Important contact information or submission details"""
+
+PDF_ANALYSIS_SECTIONS = (
+    "1. Document Type and Purpose:\n"
+    "   - What kind of document is this?\n"
+    "   - What is its main purpose?\n\n"
+    "2. Key Requirements:\n"
+    "   - What are the main requirements or conditions?\n"
+    "   - What documents or information are needed?\n\n"
+    "3. Important Deadlines:\n"
+    "   - What are the key dates and deadlines?\n"
+    "   - Are there any time-sensitive requirements?\n\n"
+    "4. Complex Terms Explained:\n"
+    "   - Explain any technical or legal terms in simple language\n"
+    "   - Clarify any complex procedures\n\n"
+    "5. Required Actions:\n"
+    "   - What steps need to be taken?\n"
+    "   - What is the process to follow?\n\n"
+    "6. Contact Information:\n"
+    "   - Who to contact for queries?\n"
+    "   - Where to submit the documents?\n\n"
 )
-Settings.embed_model = LangchainEmbedding(lc_embed_model)
+
+PDF_ANALYSIS_PROMPT = (
+    "Please analyze this government document and provide:\n"
+    + PDF_ANALYSIS_SECTIONS
+    + "Document content:\n"
+)
+
+# Map step of the chunked analysis: notes on one part of a large document
+PDF_CHUNK_PROMPT = (
+    "The following text is part {part} of {total} of a long government document. "
+    "Extract everything in it that is relevant to these sections, keeping exact "
+    "dates, amounts, names and contact details. Skip sections with nothing relevant.\n"
+    + PDF_ANALYSIS_SECTIONS
+    + "Document part:\n"
+)
+
+# Reduce step: merge the notes of all parts into the six-section analysis
+PDF_MERGE_PROMPT = (
+    "The notes below were extracted from consecutive parts of one government "
+    "document. Merge them, removing duplicates, into a single analysis that provides:\n"
+    + PDF_ANALYSIS_SECTIONS
+    + "Notes:\n"
+)
+
+SUMMARY_PROMPT = "Summarize the following content: "
+
+# Summary of one streamed analysis section; the answers are joined into one summary
+SECTION_SUMMARY_PROMPT = (
+    "Condense the following section of a document analysis. Keep its heading line "
+    "unchanged and reply with only the heading and the condensed text, without any "
+    "introduction or closing remarks:\n"
+)
+
+# Persistent cache of analyses keyed by document content, model and prompt
+analysis_cache = AnalysisCache()
+
+# Every Groq call in this process is scheduled against the RPM/TPM limits
+groq_scheduler = RateLimiterRegistry()
+
+# Token budget assumed per image in a vision prompt, and per chat turn
+# (condense question + retrieved context + answer)
+IMAGE_PROMPT_TOKENS = 1500
+CHAT_TURN_TOKENS = 3000
+
+# Concurrent analyses of the same content share one in-flight Groq call
+analysis_flight = SingleFlight()
+
+# Persistent vector indexes keyed by document content; evicted documents leave the corpus too
+index_store = IndexStore(on_delete=lambda key: get_corpus_store().remove(key))
+
+# Analyzed and generated documents, kept across refreshes and restarts
+history_store = HistoryStore()
+
+# Query parameter carrying the id that scopes a browser's document history
+OWNER_PARAM = "uid"
+OWNER_ID = re.compile(r'[0-9a-f]{32}')
+
+# Chat option that searches every document of the session at once
+ALL_DOCUMENTS = "📚 All documents"
+CORPUS_TOP_K = int(os.getenv("CORPUS_TOP_K", "6"))
+
+# Tokens of chat history sent with each turn; older turns are summarized to fit
+CHAT_MEMORY_TOKENS = int(os.getenv("CHAT_MEMORY_TOKENS", "1500"))
+
+# Number of uploaded files analyzed and indexed at the same time
+MAX_CONCURRENT_FILES = int(os.getenv("MAX_CONCURRENT_FILES", "4"))
+
+# Where analysis jobs run:
+#   thread - in a worker pool inside the Streamlit server process
+#   queue  - in worker.py processes fed through a SQLite job queue
+WORKER_MODE = os.getenv("CIVIDOC_WORKER_MODE", "thread")
+
+# PDFs estimated above this many tokens are analyzed in chunks (map-reduce)
+PDF_CHUNK_TOKENS = int(os.getenv("PDF_CHUNK_TOKENS", "6000"))
+PDF_MAP_PARALLELISM = int(os.getenv("PDF_MAP_PARALLELISM", "4"))
+
+# How the 8b summary pass runs after the PDF analysis:
+#   always    - summarize the finished analysis in one request
+#   pipelined - summarize each section while the analysis is still streaming
+#   auto      - like pipelined, but return analyses under SUMMARY_SKIP_WORDS as-is
+PDF_SUMMARY_MODE = os.getenv("PDF_SUMMARY_MODE", "always")
+SUMMARY_SKIP_WORDS = int(os.getenv("SUMMARY_SKIP_WORDS", "250"))
+
+# Top-level section headings of the analysis ("1. ", "**2. ", "### 3) "), never indented
+SECTION_HEADING = re.compile(r'^(?:#+\s*)?(?:\*\*)?([1-6])[.)]\s+(.*)')
+# Section titles the analysis prompts ask for, by number
+SECTION_TITLES = {
+    int(number): title.lower()
+    for number, title in re.findall(r'^([1-6])\. (.+):$', PDF_ANALYSIS_SECTIONS, re.MULTILINE)
+}
+
+# Pages embedded and inserted per step while a PDF is still being parsed
+INGEST_BATCH_PAGES = int(os.getenv("INGEST_BATCH_PAGES", "8"))
 
 def initialize_session_state():
     """Initialize all session state variables"""
-    if 'chat_engines' not in st.session_state:
-        st.session_state.chat_engines = {}
+    if 'index_keys' not in st.session_state:
+        st.session_state.index_keys = {}
     if 'analyses' not in st.session_state:
         st.session_state.analyses = {}
     if 'documents' not in st.session_state:
         st.session_state.documents = {}
     if 'current_doc' not in st.session_state:
         st.session_state.current_doc = None
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
-    if 'document_history' not in st.session_state:
-        st.session_state.document_history = {}
+    if 'chat_sessions' not in st.session_state:
+        st.session_state.chat_sessions = {}
+    if 'jobs' not in st.session_state:
+        st.session_state.jobs = {}
+    if 'job_errors' not in st.session_state:
+        st.session_state.job_errors = {}
+    if 'corpus_engine' not in st.session_state:
+        st.session_state.corpus_engine = None
+    current_owner_id()
+    # Every page picks up finished jobs, not only the one that started them
+    if st.session_state.jobs:
+        collect_finished_jobs()
+
+def current_owner_id():
+    """Id of the browser whose history this is, kept in the page URL across reloads"""
+    owner_id = st.query_params.get(OWNER_PARAM)
+    if not owner_id or not OWNER_ID.fullmatch(owner_id):
+        owner_id = st.session_state.get('owner_id') or uuid.uuid4().hex
+    st.session_state.owner_id = owner_id
+    # Page navigation can drop query parameters, so put it back on every run
+    if st.query_params.get(OWNER_PARAM) != owner_id:
+        st.query_params[OWNER_PARAM] = owner_id
+    return owner_id
 
 def encode_image_to_base64(image):
     """Convert PIL Image to base64 string"""
@@ -47,109 +311,373 @@ def encode_image_to_base64(image):
     image.save(buffered, format="JPEG")
     return base64.b64encode(buffered.getvalue()).decode()
 
-def process_image(image):
-    """Process image using Llama vision model"""
-    img_base64 = encode_image_to_base64(image)
-    img_url = f"data:image/jpeg;base64,{img_base64}"
-    
-    completion = client.chat.completions.create(
-        model="llama-3.2-90b-vision-preview",
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": """Please analyze this government document and provide:
-                        1. Document type and purpose
-                        2. Key requirements and deadlines
-                        3. Complex terms explained simply
-                        4. Required actions or next steps
-                        5. Important contact information or submission details"""
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": img_url
-                        }
-                    }
-                ]
-            }
-        ],
-        temperature=0.1,
-        max_tokens=1024,
-        top_p=1,
-        stream=False
+def estimate_request_tokens(prompt, max_tokens):
+    """Tokens a request may consume against the TPM limit (prompt + completion)"""
+    if isinstance(prompt, str):
+        return estimate_tokens(prompt) + max_tokens
+    text = " ".join(part["text"] for part in prompt if part["type"] == "text")
+    images = sum(1 for part in prompt if part["type"] == "image_url")
+    return estimate_tokens(text) + images * IMAGE_PROMPT_TOKENS + max_tokens
+
+async def acomplete(model, prompt, temperature=0.1, max_tokens=2048, priority=BATCH):
+    """Run a single-message Groq completion and return its text"""
+    estimated = estimate_request_tokens(prompt, max_tokens)
+    completion = await groq_scheduler.acall(
+        model,
+        estimated,
+        lambda: get_async_groq_client().chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1
+        ),
+        priority
     )
-    
+    if completion.usage:
+        groq_scheduler.settle(model, estimated, completion.usage.total_tokens)
     return completion.choices[0].message.content
 
-def generate_pdf_analysis(documents):
-    """Generate analysis from PDF documents using Groq"""
-    try:
-        # Combine all document content
-        full_text = "\n".join([doc.text for doc in documents])
-        
-        # Generate analysis using Groq
-        completion = client.chat.completions.create(
-            model="llama-3.2-90b-vision-preview",
+def complete(model, prompt, temperature=0.1, max_tokens=2048, priority=BATCH):
+    """Blocking wrapper around acomplete for synchronous callers"""
+    return run_async(acomplete(model, prompt, temperature, max_tokens, priority))
+
+async def astream_complete(model, prompt, temperature=0.1, max_tokens=2048, priority=BATCH):
+    """Run a single-message Groq completion, yielding its text as tokens arrive"""
+    stream = await groq_scheduler.acall(
+        model,
+        estimate_request_tokens(prompt, max_tokens),
+        lambda: get_async_groq_client().chat.completions.create(
+            model=model,
             messages=[
                 {
                     "role": "user",
-                    "content": (
-                        "Please analyze this government document and provide:\n"
-                        "1. Document Type and Purpose:\n"
-                        "   - What kind of document is this?\n"
-                        "   - What is its main purpose?\n\n"
-                        "2. Key Requirements:\n"
-                        "   - What are the main requirements or conditions?\n"
-                        "   - What documents or information are needed?\n\n"
-                        "3. Important Deadlines:\n"
-                        "   - What are the key dates and deadlines?\n"
-                        "   - Are there any time-sensitive requirements?\n\n"
-                        "4. Complex Terms Explained:\n"
-                        "   - Explain any technical or legal terms in simple language\n"
-                        "   - Clarify any complex procedures\n\n"
-                        "5. Required Actions:\n"
-                        "   - What steps need to be taken?\n"
-                        "   - What is the process to follow?\n\n"
-                        "6. Contact Information:\n"
-                        "   - Who to contact for queries?\n"
-                        "   - Where to submit the documents?\n\n"
-                        "Document content:\n" + full_text
-                    )
+                    "content": prompt
                 }
             ],
-            temperature=0.1,
-            max_tokens=2048,
-            top_p=1
-        )
-        
-        # Format the analysis with proper styling
-        analysis = completion.choices[0].message.content
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1,
+            stream=True
+        ),
+        priority
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
-        completionsum = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
+def stream_complete(model, prompt, temperature=0.1, max_tokens=2048, priority=INTERACTIVE):
+    """Run a single-message Groq completion, yielding its text as tokens arrive"""
+    stream = groq_scheduler.call(
+        model,
+        estimate_request_tokens(prompt, max_tokens),
+        lambda: get_groq_client().chat.completions.create(
+            model=model,
             messages=[
                 {
                     "role": "user",
-                    "content": (
-                        "Summarize the following content: " + analysis
-                    )
+                    "content": prompt
                 }
             ],
-            temperature=0.1,
-            max_tokens=2048,
-            top_p=1
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1,
+            stream=True
+        ),
+        priority
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def stream_and_cache(cache_key, chunks):
+    """Pass chunks through, caching the full text once the stream completes"""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    analysis_cache.put(cache_key, "".join(parts))
+
+def image_cache_key(file_bytes):
+    """Cache key of an uploaded image, from its file bytes as uploaded"""
+    return make_cache_key(
+        "image", file_bytes, preprocessing_settings(),
+        VISION_MODEL, IMAGE_ANALYSIS_PROMPT
+    )
+
+def encode_image_payload(image, source_size=None):
+    """Encode an image for the vision model, preprocessing it unless disabled"""
+    if not IMAGE_PREPROCESS:
+        return encode_image_to_base64(image)
+    
+    payload, stats = preprocess_image(image)
+    img_base64 = base64.b64encode(payload).decode()
+    saved = ""
+    if source_size:
+        # The upload's own size approximates the full-resolution payload sent before
+        saved = f", {(source_size * 4 // 3 - len(img_base64)) / 1024:.0f} KB saved"
+    logger.info(
+        "Vision payload %.0f KB (%dx%d -> %dx%d%s%s%s), preprocessed in %.0f ms",
+        len(img_base64) / 1024,
+        *stats['original_size'], *stats['size'],
+        ", cropped" if stats['cropped'] else "",
+        ", grayscale" if stats['grayscale'] else "",
+        saved,
+        stats['seconds'] * 1000
+    )
+    return img_base64
+
+def image_analysis_prompt(image, source_size=None):
+    """Build the vision prompt content for an image"""
+    img_base64 = encode_image_payload(image, source_size)
+    img_url = f"data:image/jpeg;base64,{img_base64}"
+    return [
+        {
+            "type": "text",
+            "text": IMAGE_ANALYSIS_PROMPT
+        },
+        {
+            "type": "image_url",
+            "image_url": {
+                "url": img_url
+            }
+        }
+    ]
+
+async def aprocess_image(image, file_bytes):
+    """Process image using Llama vision model"""
+    # Hashing and preprocessing are CPU-bound, so keep them off the event loop
+    cache_key = await asyncio.to_thread(image_cache_key, file_bytes)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    async def analyze():
+        prompt = await asyncio.to_thread(image_analysis_prompt, image, len(file_bytes))
+        start = time.perf_counter()
+        analysis = await acomplete(VISION_MODEL, prompt, max_tokens=1024)
+        logger.info(
+            "Vision request took %.2fs (preprocessing %s)",
+            time.perf_counter() - start, "on" if IMAGE_PREPROCESS else "off"
         )
+        analysis_cache.put(cache_key, analysis)
+        return analysis
+
+    return await analysis_flight.do(cache_key, analyze)
+
+def process_image(image, file_bytes):
+    """Blocking wrapper around aprocess_image"""
+    return run_async(aprocess_image(image, file_bytes))
+
+def stream_image_analysis(image, file_bytes):
+    """Streaming variant of process_image for st.write_stream"""
+    cache_key = image_cache_key(file_bytes)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    yield from stream_and_cache(
+        cache_key,
+        stream_complete(VISION_MODEL, image_analysis_prompt(image, len(file_bytes)), max_tokens=1024)
+    )
+
+def estimate_tokens(text):
+    """Rough token count for budgeting prompts (about 4 characters per token)"""
+    return len(text) // 4
 
-        analysissum = completionsum.choices[0].message.content
+def group_texts(texts, max_tokens):
+    """Greedily group consecutive texts into chunks of at most max_tokens"""
+    max_chars = max_tokens * 4
+    chunks = []
+    current = []
+    current_chars = 0
+    for text in texts:
+        # Split single texts that are larger than a whole chunk
+        pieces = [text[i:i + max_chars] for i in range(0, len(text), max_chars)] or [""]
+        for piece in pieces:
+            if current and current_chars + len(piece) > max_chars:
+                chunks.append("\n".join(current))
+                current = []
+                current_chars = 0
+            current.append(piece)
+            current_chars += len(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+async def apdf_analysis_prompt(documents, full_text, chunked, chunk_tokens=PDF_CHUNK_TOKENS, parallelism=PDF_MAP_PARALLELISM):
+    """Build the final analysis prompt, running the map step first for large PDFs"""
+    if not chunked:
+        return PDF_ANALYSIS_PROMPT + full_text
+    
+    chunks = group_texts([doc.text for doc in documents], chunk_tokens)
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def bounded(prompt):
+        async with semaphore:
+            return await acomplete(VISION_MODEL, prompt, max_tokens=1024)
+    
+    # Map: extract notes from every chunk concurrently
+    notes = await asyncio.gather(*[
+        bounded(PDF_CHUNK_PROMPT.format(part=part, total=len(chunks)) + chunk)
+        for part, chunk in enumerate(chunks, 1)
+    ])
+    
+    # Reduce: merge notes in groups until they fit in a single prompt
+    while len(notes) > 1 and estimate_tokens("\n\n".join(notes)) > chunk_tokens:
+        groups = group_texts(notes, chunk_tokens)
+        if len(groups) == len(notes):
+            break
+        notes = await asyncio.gather(*[bounded(PDF_MERGE_PROMPT + group) for group in groups])
+    
+    return PDF_MERGE_PROMPT + "\n\n".join(notes)
+
+def pdf_cache_key(full_text, chunked, chunk_tokens, summary_mode="always"):
+    cache_parts = [
+        "pdf", full_text, VISION_MODEL, PDF_ANALYSIS_PROMPT,
+        SUMMARY_MODEL, SUMMARY_PROMPT
+    ]
+    if chunked:
+        cache_parts += [PDF_CHUNK_PROMPT, PDF_MERGE_PROMPT, str(chunk_tokens)]
+    if summary_mode != "always":
+        cache_parts += [summary_mode, str(SUMMARY_SKIP_WORDS), SECTION_SUMMARY_PROMPT]
+    return make_cache_key(*cache_parts)
+
+async def aanalyze_pdf_text(documents, full_text, chunked, chunk_tokens, parallelism):
+    """Run the analysis pass over a PDF, in chunks when the document is large"""
+    prompt = await apdf_analysis_prompt(documents, full_text, chunked, chunk_tokens, parallelism)
+    return await acomplete(VISION_MODEL, prompt)
+
+async def asummarize(text, prompt=SUMMARY_PROMPT):
+    """Summarize an analysis with the small, fast model"""
+    return await acomplete(SUMMARY_MODEL, prompt + text)
+
+def section_number(line, last_heading):
+    """Number of the section a line starts, or None for any other line
+
+    Numbered lists inside a section look like headings too, so only the
+    known titles count, and only in ascending order.
+    """
+    match = SECTION_HEADING.match(line)
+    if not match:
+        return None
+    number = int(match.group(1))
+    title = SECTION_TITLES.get(number)
+    if number <= last_heading or not title or title not in match.group(2).lower():
+        return None
+    return number
+
+async def astream_sections(tokens):
+    """Group streamed analysis text into numbered sections as each one completes"""
+    section = []
+    last_heading = 0
+    pending = ""
+    async for token in tokens:
+        pending += token
+        while "\n" in pending:
+            line, pending = pending.split("\n", 1)
+            number = section_number(line, last_heading)
+            if number:
+                # Text before the first heading stays with the first section
+                if last_heading and any(l.strip() for l in section):
+                    yield "\n".join(section)
+                    section = []
+                last_heading = number
+            section.append(line)
+    section.append(pending)
+    if any(l.strip() for l in section):
+        yield "\n".join(section)
+
+async def _atimed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+async def asummarize_streamed_analysis(tokens, skip_below_words=0):
+    """Summarize a streamed analysis section by section, overlapping both passes"""
+    start = time.perf_counter()
+    sections = []
+    tasks = []
+    words = 0
+    try:
+        async for section in astream_sections(tokens):
+            sections.append(section)
+            words += len(section.split())
+            if words >= skip_below_words:
+                # Summarize every section not yet submitted while the analysis continues
+                while len(tasks) < len(sections):
+                    tasks.append(asyncio.create_task(
+                        _atimed(asummarize(sections[len(tasks)], SECTION_SUMMARY_PROMPT))
+                    ))
+        analysis_done = time.perf_counter()
+        
+        if not tasks:
+            logger.info(
+                "Skipped summary pass for a %d-word analysis (analysis took %.2fs)",
+                words, analysis_done - start
+            )
+            return "\n".join(sections)
+        
+        results = await asyncio.gather(*tasks)
+    finally:
+        # A failed analysis or summary leaves no other summaries running
+        for task in tasks:
+            task.cancel()
+    tail = time.perf_counter() - analysis_done
+    summary_seconds = sum(duration for _, duration in results)
+    logger.info(
+        "Pipelined summary of %d sections: analysis took %.2fs, summaries finished "
+        "%.2fs later; %.2fs of summarization overlapped with the analysis stream",
+        len(results), analysis_done - start, tail, max(summary_seconds - tail, 0.0)
+    )
+    return "\n\n".join(summary.strip() for summary, _ in results)
+
+async def agenerate_pdf_analysis(documents, chunk_tokens=None, parallelism=None, summary_mode=None):
+    """Generate analysis from PDF documents using Groq"""
+    chunk_tokens = chunk_tokens or PDF_CHUNK_TOKENS
+    parallelism = parallelism or PDF_MAP_PARALLELISM
+    summary_mode = summary_mode or PDF_SUMMARY_MODE
+    try:
+        # Combine all document content
+        full_text = "\n".join([doc.text for doc in documents])
+        chunked = estimate_tokens(full_text) > chunk_tokens
+
+        # Serve repeated uploads of the same document from the cache
+        cache_key = pdf_cache_key(full_text, chunked, chunk_tokens, summary_mode)
+        cached = analysis_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        return analysissum
+        # Generate analysis using Groq, in chunks when the document is large
+        async def analyze():
+            if summary_mode == "always":
+                analysis = await aanalyze_pdf_text(documents, full_text, chunked, chunk_tokens, parallelism)
+                analysissum = await asummarize(analysis)
+            else:
+                prompt = await apdf_analysis_prompt(documents, full_text, chunked, chunk_tokens, parallelism)
+                analysissum = await asummarize_streamed_analysis(
+                    astream_complete(VISION_MODEL, prompt),
+                    SUMMARY_SKIP_WORDS if summary_mode == "auto" else 0
+                )
+            analysis_cache.put(cache_key, analysissum)
+            return analysissum
+        
+        # Sessions uploading the same document at once wait on a single call
+        return await analysis_flight.do(cache_key, analyze)
     except Exception as e:
         error_msg = "Error generating PDF analysis: " + str(e)
         raise Exception(error_msg)
 
+def generate_pdf_analysis(documents, chunk_tokens=None, parallelism=None, summary_mode=None):
+    """Blocking wrapper around agenerate_pdf_analysis"""
+    return run_async(agenerate_pdf_analysis(documents, chunk_tokens, parallelism, summary_mode))
+
 def clean_llm_output(output):
     """Clean LLM output by removing HTML tags and formatting symbols"""
     # Remove HTML tags
@@ -213,7 +741,8 @@ def process_captured_image(picture):
         )
         
         # Process the image
-        image = Image.open(picture)
+        file_bytes = picture.getvalue()
+        image = Image.open(io.BytesIO(file_bytes))
         
         # Display the captured image with proper mobile sizing
         st.image(
@@ -222,9 +751,11 @@ def process_captured_image(picture):
             use_column_width=True  # Makes image responsive
         )
         
-        # Process image with AI
-        with st.spinner("Analyzing document..."):
-            analysis = process_image(image)
+        # Process image with AI, streaming tokens as they arrive
+        stream_placeholder = st.empty()
+        with stream_placeholder.container():
+            analysis = st.write_stream(stream_image_analysis(image, file_bytes))
+        stream_placeholder.empty()
         
         # Generate filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -237,8 +768,8 @@ def process_captured_image(picture):
             'timestamp': datetime.now()
         }
         
-        # Create chat engine
-        st.session_state.chat_engines[filename] = create_chat_engine(analysis)
+        # Index document for chat
+        st.session_state.index_keys[filename] = index_document(analysis, filename, profile='image')
         
         # Save to history
         save_to_history(
@@ -285,39 +816,460 @@ def process_captured_image(picture):
             f"Details: {str(e)}"
         )
 
-def process_pdf(pdf_file):
-    """Process PDF document using LlamaIndex"""
-    temp_dir = "temp_docs"
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_path = os.path.join(temp_dir, "temp.pdf")
+def iter_pdf_pages(pdf_file, file_name=None):
+    """Parse a PDF in memory, yielding one LlamaIndex Document per page as it is extracted"""
+    import pypdf
+    from llama_index.core import Document
+    
+    # Uploaded files are already in-memory buffers; raw bytes are wrapped without copying
+    if isinstance(pdf_file, (bytes, bytearray, memoryview)):
+        pdf_file = io.BytesIO(pdf_file)
+    file_name = file_name or getattr(pdf_file, "name", None) or "document.pdf"
+    pdf_file.seek(0)
+    pdf = pypdf.PdfReader(pdf_file)
+    
+    for page_number, page in enumerate(pdf.pages):
+        metadata = {
+            "page_label": pdf.page_labels[page_number],
+            "file_name": file_name
+        }
+        yield Document(text=page.extract_text(), metadata=metadata)
+
+def process_pdf(pdf_file, file_name=None):
+    """Parse a PDF in memory into one LlamaIndex Document per page"""
+    return list(iter_pdf_pages(pdf_file, file_name))
+
+def _iter_queue(pages):
+    # Yield queued pages until the producer signals the end (None) or an error
+    while True:
+        page = pages.get()
+        if page is None:
+            return
+        if isinstance(page, Exception):
+            raise page
+        yield page
+
+def analyze_pdf(file_name, file_bytes):
+    """Parse, index and analyze a PDF as a pipeline, returning (analysis, index_key)"""
+    index_key = pdf_index_key(file_bytes)
+    if index_store.exists(index_key):
+        documents = process_pdf(file_bytes, file_name)
+        return generate_pdf_analysis(documents), index_key
+    
+    # Pages are embedded in batches while parsing continues, and the LLM
+    # analysis starts as soon as parsing is done rather than after indexing
+    documents = []
+    pages = queue.Queue()
+    with ThreadPoolExecutor(max_workers=1) as indexer:
+        index_future = indexer.submit(index_pages, _iter_queue(pages), index_key)
+        try:
+            for page in iter_pdf_pages(file_bytes, file_name):
+                documents.append(page)
+                pages.put(page)
+        except Exception as e:
+            pages.put(e)
+            raise
+        pages.put(None)
+        
+        analysis = generate_pdf_analysis(documents)
+        index_future.result()
+    return analysis, index_key
+
+def analyze_file(file_name, file_type, file_bytes, owner_id=None):
+    """Analyze and index one uploaded file; safe to run in a worker thread"""
+    if file_type in ['image/jpeg', 'image/png']:
+        image = Image.open(io.BytesIO(file_bytes))
+        analysis = process_image(image, file_bytes)
+        index_key = index_document(analysis, file_name, profile='image')
+    elif file_type == 'application/pdf':
+        analysis, index_key = analyze_pdf(file_name, file_bytes)
+    else:
+        raise Exception(f"Unsupported file type for {file_name}: {file_type}")
     
-    with open(temp_path, "wb") as f:
-        f.write(pdf_file.getvalue())
+    # Saved here so the result reaches the history even if its tab is closed
+    if owner_id is not None:
+        history_store.save(owner_id, file_name, file_type.split('/')[1].upper(), analysis, datetime.now())
+    
+    return {
+        'analysis': analysis,
+        'index_key': index_key
+    }
+
+# Functions worker.py may run, looked up by the task name stored in the job queue
+JOB_TASKS = {
+    'analyze_file': analyze_file
+}
+
+def submit_analysis_job(file_name, file_type, file_bytes):
+    """Queue analyze_file in the background and track the job in this session"""
+    # PDFs are indexed page by page, so chat can start before they finish; partial
+    # indexes live in the process building them, so this needs in-process jobs
+    if file_type == 'application/pdf' and WORKER_MODE == "thread":
+        st.session_state.index_keys[file_name] = pdf_index_key(file_bytes)
+    st.session_state.job_errors.pop(file_name, None)
+    job_id = get_job_manager().submit(
+        analyze_file, file_name, file_type, file_bytes, owner_id=current_owner_id()
+    )
+    st.session_state.jobs[job_id] = {
+        'name': file_name,
+        'type': file_type
+    }
+    return job_id
+
+def collect_finished_jobs():
+    """Move finished background jobs into session state, returning the number collected"""
+    manager = get_job_manager()
+    collected = 0
+    for job_id, job in list(st.session_state.jobs.items()):
+        status = manager.status(job_id)
+        if status is None:
+            # Pruned, or lost with a server restart
+            status = {'state': FAILED, 'error': "Job was lost, please analyze the file again"}
+        if status['state'] not in (DONE, FAILED):
+            continue
+        
+        if status['state'] == DONE:
+            result = status['result']
+            st.session_state.analyses[job['name']] = {
+                'type': job['type'],
+                'analysis': result['analysis'],
+                'timestamp': datetime.now()
+            }
+            st.session_state.index_keys[job['name']] = result['index_key']
+        else:
+            st.session_state.index_keys.pop(job['name'], None)
+            st.session_state.job_errors[job['name']] = status['error']
+        
+        del st.session_state.jobs[job_id]
+        manager.forget(job_id)
+        collected += 1
+    return collected
+
+def _as_documents(content):
+    from llama_index.core import Document
+    if isinstance(content, str):
+        return [Document(text=content)]
+    return content
+
+def document_index_key(content, profile="text"):
+    """Content hash identifying the persisted index for content"""
+    documents = _as_documents(content)
+    # Prefixed with the retrieval profile, which load_chat_engine reads back
+    return f"{profile}-" + make_cache_key(
+        "index", chunking_settings(profile), *[doc.text for doc in documents]
+    )
+
+def pdf_index_key(file_bytes):
+    """Hash of the uploaded PDF bytes, known before any page is parsed"""
+    return "pdf-" + make_cache_key("index-pdf", chunking_settings("pdf"), file_bytes)
+
+def _embed_documents(documents, profile):
+    from llama_index.core import Settings
+    from llama_index.core.schema import MetadataMode
+    nodes = make_node_parser(profile).get_nodes_from_documents(documents)
+    embeddings = Settings.embed_model.get_text_embedding_batch(
+        [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    )
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+    return nodes
+
+def index_pages(pages, key, batch_pages=None):
+    """Chunk and embed pages batch by batch as they arrive, then persist the index"""
+    from llama_index.core import VectorStoreIndex
+    configure_llama_index()
+    batch_pages = batch_pages or INGEST_BATCH_PAGES
+    profile = profile_for_key(key)
     
+    # Chat can query the published nodes before the whole document is indexed
+    index_store.publish_partial(key, [])
     try:
-        reader = PDFReader()
-        documents = reader.load_data(temp_path)
-        return documents
+        nodes = []
+        batch = []
+        for page in pages:
+            batch.append(page)
+            if len(batch) >= batch_pages:
+                nodes.extend(_embed_documents(batch, profile))
+                index_store.publish_partial(key, nodes)
+                batch = []
+        if batch:
+            nodes.extend(_embed_documents(batch, profile))
+        index_store.save(key, VectorStoreIndex(nodes))
+        add_to_corpus(key, nodes)
+        # Answers came from the previous build of this index
+        get_answer_cache().invalidate(key)
     finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        if os.path.exists(temp_dir) and not os.listdir(temp_dir):
-            os.rmdir(temp_dir)
+        index_store.discard_partial(key)
+    return key
+
+def index_document(content, doc_name=None, profile="text"):
+    """Build and persist a vector index for content, returning its store key"""
+    key = document_index_key(content, profile)
+    if not index_store.exists(key):
+        from llama_index.core import VectorStoreIndex
+        configure_llama_index()
+        nodes = _embed_documents(_as_documents(content), profile)
+        index_store.save(key, VectorStoreIndex(nodes))
+        add_to_corpus(key, nodes, doc_name)
+        get_answer_cache().invalidate(key)
+    return key
+
+def add_to_corpus(key, nodes, doc_name=None):
+    """Copy embedded nodes into the corpus index, tagged with their document"""
+    from llama_index.core.schema import TextNode
+    corpus = get_corpus_store()
+    if corpus.has(key):
+        return
+    corpus_nodes = []
+    for position, node in enumerate(nodes):
+        metadata = dict(node.metadata)
+        metadata['doc_key'] = key
+        name = doc_name or metadata.get('file_name')
+        if name:
+            metadata['doc_name'] = name
+        # Ids derived from the content key make concurrent adds of one document idempotent
+        corpus_nodes.append(TextNode(
+            id_=f"{key}-{position}",
+            text=node.get_content(),
+            metadata=metadata,
+            excluded_embed_metadata_keys=['doc_key'],
+            excluded_llm_metadata_keys=['doc_key'],
+            embedding=node.embedding
+        ))
+    corpus.add(corpus_nodes)
 
-def create_chat_engine(content):
+def ensure_in_corpus(key, doc_name):
+    """Add a document indexed before the corpus existed, reusing its stored embeddings"""
+    if get_corpus_store().has(key):
+        return True
+    if not index_store.exists(key):
+        return False
+    configure_llama_index()
+    index = index_store.load(key)
+    if index is None:
+        return False
+    nodes = list(index.docstore.docs.values())
+    for node in nodes:
+        node.embedding = index.vector_store.get(node.node_id)
+    add_to_corpus(key, nodes, doc_name)
+    return True
+
+def load_chat_engine(key):
+    """Create a chat engine from a persisted index"""
+    configure_llama_index()
+    index = index_store.load(key)
+    if index is None:
+        if index_store.is_building(key):
+            raise Exception("The document is still being indexed. Please try again in a moment.")
+        raise Exception("Document index is no longer available. Please analyze the document again.")
+    profile = profile_for_key(key)
+    return index.as_chat_engine(
+        chat_mode="condense_question",
+        similarity_top_k=get_profile(profile)['top_k'],
+        node_postprocessors=make_postprocessors(profile),
+        memory=make_chat_memory(),
+        verbose=True
+    )
+
+def make_chat_memory():
+    """Token-budgeted chat memory that summarizes turns falling out of the budget"""
+    from llama_index.core.memory import ChatSummaryMemoryBuffer
+    return ChatSummaryMemoryBuffer.from_defaults(
+        llm=get_summary_llm(),
+        token_limit=CHAT_MEMORY_TOKENS
+    )
+
+def create_chat_engine(content, profile="text"):
     """Create chat engine from document content"""
-    if isinstance(content, str):
-        documents = [Document(text=content)]
+    return load_chat_engine(index_document(content, profile=profile))
+
+def current_session_id():
+    """Id of the browser session running this script"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+def restore_chat_history(chat_engine, messages):
+    """Replay earlier messages into a freshly built chat engine"""
+    for message in messages:
+        chat_engine._memory.put(message)
+
+def get_chat_session(doc_name):
+    """Conversation about one document, created when it is first selected"""
+    sessions = st.session_state.chat_sessions
+    if doc_name not in sessions:
+        sessions[doc_name] = {
+            'messages': [
+                {"role": "assistant", "content": f"Hello! I'm here to help you understand {doc_name}. What would you like to know?"}
+            ]
+        }
+    return sessions[doc_name]
+
+def stored_chat_history(doc_name):
+    """Completed turns of a document's conversation, as LlamaIndex chat messages"""
+    from llama_index.core.llms import ChatMessage
+    session = st.session_state.chat_sessions.get(doc_name)
+    if not session:
+        return []
+    # Skip the welcome message, failed turns and the turn still in progress
+    history = []
+    messages = session['messages']
+    for question, answer in zip(messages, messages[1:]):
+        if question['role'] == 'user' and answer['role'] == 'assistant' and not answer.get('error'):
+            history.append(ChatMessage(role='user', content=question['content']))
+            history.append(ChatMessage(role='assistant', content=answer['content']))
+    return history
+
+def reset_chat(doc_name):
+    """Forget the conversation about a document, keeping its engine warm"""
+    st.session_state.chat_sessions.pop(doc_name, None)
+    if doc_name == ALL_DOCUMENTS:
+        if st.session_state.corpus_engine:
+            st.session_state.corpus_engine['engine'].reset()
+        return
+    registry = get_chat_registry()
+    key = st.session_state.index_keys.get(doc_name)
+    chat_engine = registry.get(current_session_id(), doc_name, key)
+    if chat_engine is not None:
+        chat_engine.reset()
     else:
-        documents = content
+        registry.discard(current_session_id(), doc_name)
+
+def get_chat_engine(doc_name):
+    """Return the chat engine for a document, rebuilding it from its index if evicted"""
+    key = st.session_state.index_keys[doc_name]
+    registry = get_chat_registry()
+    session_id = current_session_id()
+    chat_engine = registry.get(session_id, doc_name, key)
+    if chat_engine is None:
+        # A queued PDF job has its index key before it starts indexing
+        queued = any(job['name'] == doc_name for job in st.session_state.jobs.values())
+        if queued and not index_store.exists(key) and not index_store.is_building(key):
+            raise Exception("The document is still being indexed. Please try again in a moment.")
+        chat_engine = load_chat_engine(key)
+        # Engines over a partially indexed document are rebuilt on the next turn,
+        # so they are not cached but still continue the conversation
+        if not index_store.exists(key):
+            restore_chat_history(chat_engine, stored_chat_history(doc_name))
+            return chat_engine
+        # Resume where the conversation left off, e.g. after eviction or re-analysis
+        restore_chat_history(
+            chat_engine,
+            registry.evicted_history(session_id, doc_name, key) or stored_chat_history(doc_name)
+        )
+        registry.put(session_id, doc_name, key, chat_engine, index_store.size(key))
+    return chat_engine
+
+def chat_memory_stats():
+    """Chat engine memory gauges for this session and the whole server"""
+    registry = get_chat_registry()
+    return registry.session_stats(current_session_id()), registry.stats()
+
+def get_corpus_chat_engine():
+    """Return a chat engine searching every indexed document of this session at once"""
+    keys = sorted({
+        key for doc_name, key in st.session_state.index_keys.items()
+        if ensure_in_corpus(key, doc_name)
+    })
+    if not keys:
+        raise Exception("No document has finished indexing yet. Please try again in a moment.")
+    cached = st.session_state.corpus_engine
+    if cached and cached['keys'] == keys:
+        return cached['engine']
+    
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+    configure_llama_index()
+    index = VectorStoreIndex.from_vector_store(get_corpus_store())
+    # One similarity search over the corpus, restricted to this session's documents
+    filters = MetadataFilters(filters=[
+        MetadataFilter(key='doc_key', value=keys, operator=FilterOperator.IN)
+    ])
+    chat_engine = index.as_chat_engine(
+        chat_mode="condense_question",
+        filters=filters,
+        similarity_top_k=CORPUS_TOP_K,
+        memory=make_chat_memory(),
+        verbose=True
+    )
+    if cached:
+        # Keep the conversation going when a newly analyzed document joins the corpus
+        restore_chat_history(chat_engine, cached['engine'].chat_history)
+    else:
+        restore_chat_history(chat_engine, stored_chat_history(ALL_DOCUMENTS))
+    st.session_state.corpus_engine = {'keys': keys, 'engine': chat_engine}
+    return chat_engine
+
+def answer_scope(doc_name):
+    """Answer cache scope of a chat: the index it answers from, or None if still building"""
+    if doc_name == ALL_DOCUMENTS:
+        return make_cache_key("corpus", *st.session_state.corpus_engine['keys'])
+    key = st.session_state.index_keys[doc_name]
+    return key if index_store.exists(key) else None
+
+def stream_and_remember(chunks, scope, question, embedding):
+    """Pass answer chunks through, caching the full answer once the stream completes"""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    answer = "".join(parts).strip()
+    if answer:
+        get_answer_cache().put(scope, question, embedding, answer)
+
+def start_chat_stream(chat_engine, prompt):
+    """Send a streaming chat turn and wait for its first token, so a failed request raises here"""
+    history = chat_engine.chat_history
+    # The answer request is only sent once the engine starts reading its stream
+    response = chat_engine.stream_chat(prompt)
+    chunks = response.response_gen
+    try:
+        first = next(chunks, None)
+    except Exception:
+        # Drop the question the failed turn recorded, so a retry does not repeat it
+        chat_engine._memory.set(history)
+        raise
+    return itertools.chain([first] if first else [], chunks)
+
+def stream_chat(doc_name, prompt):
+    """Start a streaming chat turn, returning a generator of answer text"""
+    if doc_name == ALL_DOCUMENTS:
+        chat_engine = get_corpus_chat_engine()
+    else:
+        chat_engine = get_chat_engine(doc_name)
+    
+    # Only opening questions are cached: follow-ups depend on the conversation
+    scope = answer_scope(doc_name) if not chat_engine.chat_history else None
+    if scope is not None:
+        from llama_index.core.llms import ChatMessage
+        embedding = get_embedding_service().embed([prompt])[0]
+        answer = get_answer_cache().lookup(scope, embedding)
+        if answer is not None:
+            # Record the turn so follow-up questions have their context
+            restore_chat_history(chat_engine, [
+                ChatMessage(role='user', content=prompt),
+                ChatMessage(role='assistant', content=answer)
+            ])
+            return iter([answer])
     
-    index = VectorStoreIndex.from_documents(documents)
-    return index.as_chat_engine(chat_mode="condense_question", verbose=True)
+    # Scheduled ahead of batch analysis
+    chunks = groq_scheduler.call(
+        VISION_MODEL,
+        2 * estimate_tokens(prompt) + CHAT_TURN_TOKENS,
+        lambda: start_chat_stream(chat_engine, prompt),
+        INTERACTIVE
+    )
+    if scope is None:
+        return chunks
+    return stream_and_remember(chunks, scope, prompt, embedding)
 
-def generate_document(doc_type, fields):
-    """Generate and fill templates based on document type and user fields"""
-    # Template prompt for Llama to generate and fill
-    prompt = f"""Create an official {doc_type} with the details provided below. 
+def answer_cache_stats():
+    """Hit rate of the semantic answer cache"""
+    return get_answer_cache().stats()
+
+def document_prompt(doc_type, fields):
+    """Template prompt for Llama to generate and fill"""
+    return f"""Create an official {doc_type} with the details provided below. 
     Ensure the document format meets standard government requirements.
 
     Details:
@@ -326,49 +1278,54 @@ def generate_document(doc_type, fields):
     Structure the document with proper headings, formatting, and placeholders as appropriate for an official {doc_type}.
     """
 
-    completion = client.chat.completions.create(
-        model="llama-3.2-90b-vision-preview",
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
+def stream_document(doc_type, fields):
+    """Generate a filled-in document, yielding its text for st.write_stream"""
+    yield from stream_complete(
+        VISION_MODEL,
+        document_prompt(doc_type, fields),
         temperature=0.7,
-        max_tokens=4096,
-        top_p=1
+        max_tokens=4096
     )
     
-    return completion.choices[0].message.content
-    
 def save_to_history(doc_name, doc_type, content, timestamp=None):
     """Save document to history with metadata"""
     if timestamp is None:
         timestamp = datetime.now()
     
-    st.session_state.document_history[doc_name] = {
-        'type': doc_type,
-        'content': content,
-        'timestamp': timestamp,
-        'status': 'Processed'
-    }
+    history_store.save(current_owner_id(), doc_name, doc_type, content, timestamp, status='Processed')
+
+def get_document_history(doc_types=None, start=None, end=None, limit=None, offset=0):
+    """Retrieve one page of document history, newest first, without content"""
+    return dict(history_store.list(current_owner_id(), doc_types, start, end, limit, offset))
+
+def count_document_history(doc_types=None, start=None, end=None):
+    """Count history entries matching the filters"""
+    return history_store.count(current_owner_id(), doc_types, start, end)
 
-def get_document_history():
-    """Retrieve document history sorted by timestamp"""
-    history = st.session_state.document_history
-    return dict(sorted(
-        history.items(),
-        key=lambda x: x[1]['timestamp'],
-        reverse=True
-    ))
+def search_history(text, limit=20):
+    """Full-text search over history names and content, best matches first"""
+    return dict(history_store.search(current_owner_id(), text, limit))
+
+def get_document_types():
+    """Distinct document types in the history, for filter options"""
+    return history_store.types(current_owner_id())
+
+def get_document(doc_name):
+    """Retrieve a single history entry including its content"""
+    return history_store.get(current_owner_id(), doc_name)
 
 def delete_from_history(doc_name):
     """Delete document from history"""
-    if doc_name in st.session_state.document_history:
-        del st.session_state.document_history[doc_name]
-        if doc_name in st.session_state.chat_engines:
-            del st.session_state.chat_engines[doc_name]
-        if doc_name in st.session_state.analyses:
-            del st.session_state.analyses[doc_name]
-        if st.session_state.current_doc == doc_name:
-            st.session_state.current_doc = None
+    history_store.delete(current_owner_id(), doc_name)
+    get_chat_registry().discard(current_session_id(), doc_name)
+    if doc_name in st.session_state.index_keys:
+        del st.session_state.index_keys[doc_name]
+        st.session_state.corpus_engine = None
+    st.session_state.chat_sessions.pop(doc_name, None)
+    if doc_name in st.session_state.analyses:
+        del st.session_state.analyses[doc_name]
+    if st.session_state.current_doc == doc_name:
+        st.session_state.current_doc = None
 
 def format_timestamp(timestamp):
     """Format timestamp for display"""
@@ -0,0 +1,114 @@
+"""Out-of-process analysis worker
+
+Start the app with CIVIDOC_WORKER_MODE=queue and run one or more workers
+per node next to it:
+
+    python worker.py --threads 2
+
+Workers share the job queue, analysis cache and index store through
+CIVIDOC_CACHE_DIR, so it must point at the same directory for all of them.
+
+Rate limits and single-flight are per process. Each worker schedules
+against its own share of GROQ_RPM and GROQ_TPM, so give every process a
+share that adds up to at most 1 across workers and the app, e.g.
+
+    GROQ_BUDGET_SHARE=0.5 streamlit run 🏛️_CiviDoc_AI.py
+    python worker.py --share 0.25   # on each of two workers
+
+Identical uploads analyzed by different workers at the same time are not
+coalesced; only the analysis cache deduplicates them once one finishes.
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from jobs import JobQueue
+from rate_limiter import GROQ_BUDGET_SHARE
+from utils import JOB_TASKS, groq_scheduler
+
+logger = logging.getLogger("cividoc.worker")
+
+# Seconds an idle worker waits before checking the queue again
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1"))
+
+
+def keep_alive(job_queue, job_id, worker, done):
+    """Heartbeat the job until done is set, so other workers leave it alone"""
+    while not done.wait(job_queue.lease_seconds / 4):
+        job_queue.heartbeat(job_id, worker)
+
+
+def run_job(job_queue, worker, job):
+    """Run one claimed job and store its result or error"""
+    job_id, task, args, kwargs = job
+    done = threading.Event()
+    threading.Thread(
+        target=keep_alive, args=(job_queue, job_id, worker, done), daemon=True
+    ).start()
+    start = time.perf_counter()
+    try:
+        if task not in JOB_TASKS:
+            raise Exception(f"Unknown task: {task}")
+        result = JOB_TASKS[task](*args, **kwargs)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, task)
+        job_queue.fail(job_id, str(e))
+    else:
+        logger.info("Job %s (%s) finished in %.1fs", job_id, task, time.perf_counter() - start)
+        job_queue.complete(job_id, result)
+    finally:
+        done.set()
+
+
+def work(job_queue, worker):
+    """Claim and run jobs until the process is stopped"""
+    while True:
+        job = job_queue.claim(worker)
+        if job is None:
+            time.sleep(WORKER_POLL_SECONDS)
+            continue
+        run_job(job_queue, worker, job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run CiviDoc AI analysis jobs from the job queue")
+    parser.add_argument(
+        "--threads", type=int, default=1,
+        help="jobs run concurrently by this process (LLM calls overlap, embedding is shared)"
+    )
+    parser.add_argument(
+        "--share", type=float, default=GROQ_BUDGET_SHARE,
+        help="fraction of the Groq account's RPM/TPM this worker may use"
+    )
+    args = parser.parse_args()
+    if not 0 < args.share <= 1:
+        parser.error("--share must be in (0, 1]")
+    groq_scheduler.share = args.share
+
+    job_queue = JobQueue()
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    logger.info(
+        "Worker %s polling %s with %d thread(s) and %.0f%% of the Groq budget",
+        name, job_queue.path, args.threads, args.share * 100
+    )
+
+    threads = [
+        threading.Thread(
+            target=work, args=(job_queue, f"{name}-{uuid.uuid4().hex[:6]}"), daemon=True
+        )
+        for _ in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        logger.info("Worker %s stopping", name)
+
+
+if __name__ == "__main__":
+    main()